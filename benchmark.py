@@ -0,0 +1,205 @@
+import subprocess
+import tempfile
+from functools import partial
+from pathlib import Path
+
+import polars as pl
+import typer
+
+from skolegpt_instruct_dataset.async_translate import AsyncDeepLTranslator
+from skolegpt_instruct_dataset.cache import TranslationCache
+from skolegpt_instruct_dataset.checkpoint import ShardedCheckpoint
+from skolegpt_instruct_dataset.config import config
+from skolegpt_instruct_dataset.filtering import (
+    evaluate_filter_rules,
+    filter_steps,
+    stratify_dataframe,
+)
+from skolegpt_instruct_dataset.generate import OpenAIChatBackend, generate_responses
+from skolegpt_instruct_dataset.id_index import TranslatedIdIndex
+from skolegpt_instruct_dataset.mock_completions import run_mock_completion_server
+from skolegpt_instruct_dataset.mock_deepl import run_mock_deepl_server
+from skolegpt_instruct_dataset.profiling import StepProfiler
+from skolegpt_instruct_dataset.synthetic import generate_synthetic_data
+from skolegpt_instruct_dataset.translate import translate_dataset
+from skolegpt_instruct_dataset.unicode_scripts import script_profile
+
+SUITES = ["filter", "stratify", "scripts", "translate", "generate"]
+
+
+def current_commit() -> str:
+    """Short hash of HEAD, with a "-dirty" suffix for uncommitted changes."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + "-dirty" if status else commit
+
+
+def load_synthetic_data(n_rows: int, seed: int) -> pl.DataFrame:
+    """Generates the synthetic dataset once and reuses it from data/synthetic."""
+    path = config.data_dir / "synthetic" / f"synthetic_{n_rows}_{seed}.parquet"
+    if path.is_file():
+        return pl.read_parquet(path)
+    df = generate_synthetic_data(n_rows, seed=seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df.write_parquet(path)
+    return df
+
+
+def benchmark_filter(df: pl.DataFrame, profiler: StepProfiler, work_dir: Path):
+    # A local index holding every hundredth id stands in for the translated ids
+    index = TranslatedIdIndex(work_dir / "translated_ids")
+    index.add(df["id"].gather_every(100))
+
+    steps = filter_steps(config.common_prefixes, config.common_postfixes)
+    steps = [
+        (
+            (step, partial(evaluate_filter_rules, index=index))
+            if step == "evaluate_filter_rules"
+            else (step, func)
+        )
+        for step, func in steps
+    ]
+    filtered = df
+    for step, func in steps:
+        filtered = profiler.run(step, func, filtered)
+
+    # The same steps as one lazy streaming query, as filter_dataset.py runs them
+    def run_lazy_pipeline(df):
+        lf = df.lazy()
+        for _, func in steps:
+            lf = func(lf)
+        return lf.collect(streaming=True)
+
+    profiler.run("filter_data_lazy", run_lazy_pipeline, df)
+
+
+def benchmark_translate(
+    df: pl.DataFrame, profiler: StepProfiler, work_dir: Path, latency: float
+):
+    with run_mock_deepl_server(latency=latency) as server:
+        translator = AsyncDeepLTranslator(
+            url=server.url, auth_key="benchmark", requests_per_second=None
+        )
+        profiler.run(
+            "translate_dataset",
+            lambda df: translate_dataset(
+                df,
+                save_freq=1000,
+                translator=translator,
+                cache=TranslationCache(work_dir / "translation_cache.sqlite"),
+                checkpoint=ShardedCheckpoint(work_dir / "translation_checkpoint"),
+            ),
+            df,
+        )
+        print(f"DeepL requests: {translator.stats}")
+
+
+def benchmark_generate(df: pl.DataFrame, profiler: StepProfiler, latency: float):
+    with run_mock_completion_server(latency=latency) as server:
+        profiler.run(
+            "generate_responses",
+            lambda df: generate_responses(
+                df, backend=OpenAIChatBackend(url=server.url)
+            ),
+            df,
+        )
+
+
+def compare(results_path: Path, baseline: str, commit: str) -> pl.DataFrame:
+    """Wall times of the latest runs of `commit` relative to `baseline`."""
+    results = pl.read_ndjson(results_path)
+    keys = ["suite", "n_rows", "step"]
+
+    def latest(commit: str) -> pl.DataFrame:
+        return (
+            results.filter(pl.col("commit") == commit)
+            .sort("run_id")
+            .group_by(keys)
+            .agg(pl.col("wall_time_s").last())
+        )
+
+    return (
+        latest(baseline)
+        .join(latest(commit), on=keys, suffix="_current")
+        .with_columns(
+            (pl.col("wall_time_s_current") / pl.col("wall_time_s")).alias("ratio")
+        )
+        .sort(keys)
+    )
+
+
+def main(
+    n_rows: list[int] = typer.Option(config.benchmark_sizes),
+    suite: list[str] = typer.Option(SUITES, help=f"One or more of {SUITES}."),
+    translate_rows: int = typer.Option(
+        2000, help="Rows translated or answered against the mock servers."
+    ),
+    mock_latency: float = 0.05,
+    seed: int = config.seed,
+    baseline: str = typer.Option(
+        None, help="Commit to compare the wall times of this run against."
+    ),
+):
+    commit = current_commit()
+    results_path = config.data_dir / config.benchmark_results_file_name
+
+    for n in n_rows:
+        df = load_synthetic_data(n, seed)
+        print(f"Benchmarking {len(df)} synthetic rows at commit {commit}.")
+
+        for name in suite:
+            profiler = StepProfiler(
+                report_path=results_path,
+                labels={"commit": commit, "suite": name, "n_rows": n},
+            )
+            with tempfile.TemporaryDirectory() as work_dir:
+                if name == "filter":
+                    benchmark_filter(df, profiler, Path(work_dir))
+                elif name == "stratify":
+                    profiler.run(
+                        "stratify_dataframe",
+                        lambda df: stratify_dataframe(
+                            df,
+                            n_total=config.n_total,
+                            instruction_sources=config.instruction_sources,
+                            seed=seed,
+                        ),
+                        df,
+                    )
+                elif name == "scripts":
+                    profiler.run(
+                        "script_profile",
+                        lambda df: (script_profile(df), df)[1],
+                        df,
+                    )
+                elif name == "translate":
+                    benchmark_translate(
+                        df.head(translate_rows), profiler, Path(work_dir), mock_latency
+                    )
+                elif name == "generate":
+                    benchmark_generate(df.head(translate_rows), profiler, mock_latency)
+                else:
+                    raise ValueError(f"Unknown suite {name}, expected one of {SUITES}.")
+            print(profiler.table())
+
+    print(f"Results appended to {results_path}.")
+    if baseline is not None:
+        with pl.Config(tbl_rows=-1):
+            print(compare(results_path, baseline, commit))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,37 @@
+import typer
+
+from skolegpt_instruct_dataset.budget import budget_report, plan_translation_budget
+from skolegpt_instruct_dataset.config import config
+from skolegpt_instruct_dataset.tokens import total_tokens
+from skolegpt_instruct_dataset.utils import load_parquet_file_with_polars
+
+
+def main(
+    max_budget_in_eur: float = config.translation_budget_in_eur,
+    max_chars: int = config.translation_budget_chars,
+    value_column: str = None,
+):
+    df = load_parquet_file_with_polars(
+        config.data_dir / config.stratified_dataset_file_name
+    )
+
+    df_selected = plan_translation_budget(
+        df=df,
+        max_budget_in_eur=max_budget_in_eur,
+        max_chars=max_chars,
+        value_column=value_column,
+    )
+
+    report = budget_report(df_selected)
+    print(
+        f"Selected {report['rows']} of {len(df)} rows with "
+        f"{report['billable_characters']} billable characters "
+        f"({report['cost_in_eur']:.2f} EUR) and {total_tokens(df_selected)} "
+        "question and response tokens."
+    )
+
+    df_selected.write_parquet(config.data_dir / config.budgeted_dataset_file_name)
+
+
+if __name__ == "__main__":
+    typer.run(main)
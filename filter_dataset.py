@@ -1,28 +1,110 @@
+import logging
 import pathlib
 
+import polars as pl
 import typer
 
 from skolegpt_instruct_dataset.config import config
-from skolegpt_instruct_dataset.filtering import filter_data
-from skolegpt_instruct_dataset.utils import load_parquet_file_with_polars
+from skolegpt_instruct_dataset.filtering import (
+    filter_data,
+    rejection_reasons,
+    rule_evaluation_steps,
+    selection_steps,
+)
+from skolegpt_instruct_dataset.profiling import StepProfiler
+from skolegpt_instruct_dataset.utils import scan_parquet_file_with_polars
 
 
 def main(
     n_total: int = config.n_total,
     seed: int = config.seed,
+    profile: bool = typer.Option(
+        False, help="Run the steps one by one and report time, memory and rows."
+    ),
+    profile_step: list[str] = typer.Option(
+        [], help="Step to run under cProfile, can be repeated. Implies --profile."
+    ),
+    profile_rules: bool = typer.Option(
+        False, help="Also time every filter rule on its own. Implies --profile."
+    ),
+    reuse_evaluated: bool = typer.Option(
+        False,
+        help="Reuse the evaluated filter rules, e.g. after toggling rules in Config.",
+    ),
 ):
-    df = load_parquet_file_with_polars(
+    if profile or profile_step or profile_rules:
+        profile_filtering(profile_step, profile_rules)
+        return
+
+    evaluated_path = config.data_dir / config.filter_evaluated_file_name
+    if not reuse_evaluated or not evaluated_path.is_file():
+        evaluate()
+    select()
+
+
+def evaluate():
+    """Cleans the sampled dataset and evaluates the filter rules on every row."""
+    lf = scan_parquet_file_with_polars(
         config.data_dir / config.sampled_dataset_file_name
     )
+    for _, func in rule_evaluation_steps(
+        common_prefixes=config.common_prefixes,
+        common_postfixes=config.common_postfixes,
+    ):
+        lf = func(lf)
+
+    # Run the query with the streaming engine, so memory stays bounded
+    lf.sink_parquet(config.data_dir / config.filter_evaluated_file_name)
+
+    rejections = rejection_reasons(
+        pl.scan_parquet(config.data_dir / config.filter_evaluated_file_name)
+    )
+    rejections.write_parquet(config.data_dir / config.filter_rejections_file_name)
+    with pl.Config(tbl_rows=-1):
+        print(rejections)
+
 
+def select():
+    """Drops the rows rejected by the enabled rules and the duplicates."""
+    lf = pl.scan_parquet(config.data_dir / config.filter_evaluated_file_name)
+    original_dataset_size = lf.select(pl.len()).collect().item()
+    if config.disabled_filter_rules:
+        print(f"Disabled filter rules: {config.disabled_filter_rules}")
+
+    for _, func in selection_steps(disabled_rules=config.disabled_filter_rules):
+        lf = func(lf)
+    lf.sink_parquet(config.data_dir / config.filtered_dataset_file_name)
+
+    filtered_dataset_size = (
+        pl.scan_parquet(config.data_dir / config.filtered_dataset_file_name)
+        .select(pl.len())
+        .collect()
+        .item()
+    )
+    percent_removed = round(
+        100 * (1 - filtered_dataset_size / original_dataset_size), 4
+    )
+    print(f"{percent_removed} % of dataset removed after preprocessing.")
+
+
+def profile_filtering(profile_steps: list[str], profile_rules: bool = False):
+    """Runs the filter steps eagerly under a StepProfiler."""
+    df = pl.read_parquet(config.data_dir / config.sampled_dataset_file_name)
+    profiler = StepProfiler(
+        report_path=config.data_dir / config.filter_profile_file_name,
+        profile_steps=profile_steps,
+    )
     df = filter_data(
         df=df,
         common_postfixes=config.common_postfixes,
         common_prefixes=config.common_prefixes,
+        profiler=profiler,
+        profile_rules=profile_rules,
     )
-
     df.write_parquet(config.data_dir / config.filtered_dataset_file_name)
+    print(f"Step profile appended to {profiler.report_path}.")
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     typer.run(main)
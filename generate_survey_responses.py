@@ -0,0 +1,58 @@
+import typer
+
+from skolegpt_instruct_dataset.cache import CompletionCache
+from skolegpt_instruct_dataset.checkpoint import ShardedCheckpoint, checkpoint_directory
+from skolegpt_instruct_dataset.config import config
+from skolegpt_instruct_dataset.generate import (
+    OpenAIChatBackend,
+    generate_responses,
+    load_survey_questions,
+)
+
+
+def main(
+    url: str = config.completion_url,
+    model: str = config.completion_model,
+    temperature: float = config.completion_temperature,
+    concurrency: int = config.completion_concurrency,
+    max_retries: int = config.completion_max_retries,
+    save_freq: int = 100,
+    cache: bool = True,
+    resume: bool = False,
+):
+    input_path = config.data_dir / config.survey_questions_file_name
+    df = load_survey_questions(input_path)
+
+    backend = OpenAIChatBackend(url=url, concurrency=concurrency)
+    completion_cache = CompletionCache() if cache else None
+    checkpoint = ShardedCheckpoint(
+        checkpoint_directory(
+            config.data_dir / config.generation_checkpoint_dir_name, input_path
+        ),
+        resume=resume,
+    )
+
+    df = generate_responses(
+        df,
+        backend=backend,
+        model=model,
+        temperature=temperature,
+        concurrency=concurrency,
+        max_retries=max_retries,
+        save_freq=save_freq,
+        cache=completion_cache,
+        checkpoint=checkpoint,
+    )
+
+    df = df.select("id", "system_prompt", "question", "response", "source")
+    df.write_parquet(config.data_dir / config.survey_instructions_file_name)
+
+    n_missing = df["response"].null_count()
+    if n_missing:
+        print(f"{n_missing} responses failed, rerun with --resume to retry them.")
+    else:
+        checkpoint.remove()
+
+
+if __name__ == "__main__":
+    typer.run(main)
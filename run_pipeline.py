@@ -0,0 +1,165 @@
+import logging
+import pathlib
+
+import typer
+
+import budget_dataset
+import filter_dataset
+import sample_dataset
+import stratify_dataset
+import translate_dataset
+from skolegpt_instruct_dataset.config import config
+from skolegpt_instruct_dataset.pipeline import Stage, package_dir, run_pipeline
+from skolegpt_instruct_dataset.utils import create_directory_if_not_exists
+
+root_dir = pathlib.Path(__file__).parent
+
+
+def build_stages(source_path: pathlib.Path = None, resume: bool = True) -> list[Stage]:
+    sampled = config.data_dir / config.sampled_dataset_file_name
+    evaluated = config.data_dir / config.filter_evaluated_file_name
+    rejections = config.data_dir / config.filter_rejections_file_name
+    filtered = config.data_dir / config.filtered_dataset_file_name
+    stratified = config.data_dir / config.stratified_dataset_file_name
+    budgeted = config.data_dir / config.budgeted_dataset_file_name
+    translated = config.data_dir / config.translated_dataset_file_name
+    retry_queue = config.data_dir / config.translation_retry_queue_file_name
+    rejected = config.data_dir / config.translation_rejected_file_name
+
+    def modules(*names: str) -> list[pathlib.Path]:
+        return [package_dir / f"{name}.py" for name in names]
+
+    return [
+        Stage(
+            name="sample",
+            run=lambda: sample_dataset.main(source_path=source_path),
+            inputs=[source_path] if source_path is not None else [],
+            outputs=[sampled],
+            config_fields=["n_max", "seed", "sample_batch_size"],
+            code=[root_dir / "sample_dataset.py", *modules("data")],
+        ),
+        # The translated id index is appended to by the translate stage and by
+        # merges into the master dataset, so it is not tracked. Rows translated
+        # since the last evaluation are only excluded once the sample or the
+        # filter settings change.
+        Stage(
+            name="evaluate_filter_rules",
+            run=filter_dataset.evaluate,
+            inputs=[sampled],
+            outputs=[evaluated, rejections],
+            config_fields=[
+                "common_prefixes",
+                "common_postfixes",
+                "tokenizer_encoding",
+                "max_example_tokens",
+                "allowed_scripts",
+                "max_foreign_script_ratio",
+            ],
+            code=[
+                root_dir / "filter_dataset.py",
+                *modules(
+                    "filtering", "affixes", "id_index", "tokens", "unicode_scripts"
+                ),
+            ],
+        ),
+        # Toggling filter rules in Config only reruns this stage
+        Stage(
+            name="filter",
+            run=filter_dataset.select,
+            inputs=[evaluated],
+            outputs=[filtered],
+            config_fields=[
+                "disabled_filter_rules",
+                "near_dedup_enabled",
+                "near_duplicate_threshold",
+                "minhash_num_permutations",
+                "minhash_bands",
+                "minhash_shingle_size",
+            ],
+            code=[root_dir / "filter_dataset.py", *modules("filtering", "dedup")],
+        ),
+        Stage(
+            name="stratify",
+            run=stratify_dataset.main,
+            inputs=[filtered],
+            outputs=[stratified],
+            config_fields=[
+                "n_total",
+                "seed",
+                "instruction_sources",
+                "stratification_keys",
+                "question_length_buckets",
+                "question_token_buckets",
+            ],
+            code=[root_dir / "stratify_dataset.py", *modules("filtering", "tokens")],
+        ),
+        Stage(
+            name="budget",
+            run=budget_dataset.main,
+            inputs=[stratified],
+            outputs=[budgeted],
+            config_fields=[
+                "translation_budget_in_eur",
+                "translation_budget_chars",
+                "deepl_price_per_million_chars",
+            ],
+            code=[root_dir / "budget_dataset.py", *modules("budget")],
+        ),
+        # The checkpoint is keyed to the content of the budgeted dataset, so an
+        # interrupted translation of the same input is resumed by default
+        Stage(
+            name="translate",
+            run=lambda: translate_dataset.main(
+                input_file_name=config.budgeted_dataset_file_name, resume=resume
+            ),
+            inputs=[budgeted],
+            outputs=[translated, retry_queue, rejected],
+            config_fields=[
+                "seed",
+                "deepl_url",
+                "translate_segments",
+                "translate_templates",
+                "template_min_count",
+                "template_min_chars",
+                "translation_length_ratio_bounds",
+                "translation_check_min_chars",
+                "max_english_word_ratio",
+                "translation_max_retry_attempts",
+            ],
+            code=[
+                root_dir / "translate_dataset.py",
+                *modules(
+                    "translate",
+                    "async_translate",
+                    "cache",
+                    "checkpoint",
+                    "segments",
+                    "templates",
+                    "validation",
+                    "id_index",
+                ),
+            ],
+        ),
+    ]
+
+
+def main(
+    until: str = "translate",
+    force: bool = False,
+    source_path: pathlib.Path = None,
+    resume: bool = True,
+):
+    create_directory_if_not_exists(config.data_dir)
+
+    stages = build_stages(source_path=source_path, resume=resume)
+    stage_names = [stage.name for stage in stages]
+    if until not in stage_names:
+        raise typer.BadParameter(f"--until must be one of {stage_names}")
+    stages = stages[: stage_names.index(until) + 1]
+
+    run_pipeline(stages, force=force)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    typer.run(main)
@@ -1,22 +1,43 @@
+import pathlib
+
 import typer
 
 from skolegpt_instruct_dataset.config import config
-from skolegpt_instruct_dataset.data import get_data
+from skolegpt_instruct_dataset.data import get_data_from_row_groups, write_sampled_data
 from skolegpt_instruct_dataset.utils import create_directory_if_not_exists
 
 
 def main(
     n_max: int = config.n_max,
     seed: int = config.seed,
+    source_path: pathlib.Path = None,
+    exact: bool = False,
+    n_workers: int = None,
 ):
     create_directory_if_not_exists(config.data_dir)
 
-    df = get_data(
+    if exact:
+        # Exact seeded sample read in parallel from the row groups of a local copy
+        if source_path is None:
+            raise typer.BadParameter("--exact requires --source-path.")
+        df = get_data_from_row_groups(
+            source_path=source_path,
+            n_max=n_max,
+            seed=seed,
+            n_workers=n_workers,
+        )
+        df.write_parquet(config.data_dir / config.sampled_dataset_file_name)
+        print(f"Completed sampling {len(df)} examples.")
+        return
+
+    n_rows = write_sampled_data(
+        output_path=config.data_dir / config.sampled_dataset_file_name,
         n_max=n_max,
         seed=seed,
+        source_path=source_path,
     )
 
-    df.write_parquet(config.data_dir / config.sampled_dataset_file_name)
+    print(f"Completed sampling {n_rows} examples.")
 
 
 if __name__ == "__main__":
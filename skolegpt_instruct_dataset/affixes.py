@@ -0,0 +1,85 @@
+import re
+
+import polars as pl
+
+
+def _alternation(terms: list[str]) -> str:
+    # Longest terms first, so e.g. "Teacher: Let's think:" wins over "Teacher:"
+    escaped = [re.escape(term) for term in sorted(set(terms), key=len, reverse=True)]
+    return "(?:" + "|".join(escaped) + ")"
+
+
+def prefix_pattern(prefixes: list[str]) -> str:
+    """Regex matching a run of stacked prefixes, e.g. "Teacher: Question:"."""
+    return r"^\s*(?:" + _alternation(prefixes) + r"\s*)+"
+
+
+def postfix_pattern(postfixes: list[str]) -> str:
+    """Regex matching a run of stacked postfixes at the end of a text."""
+    return r"(?:\s*" + _alternation(postfixes) + r")+\s*$"
+
+
+def strip_affixes(text: pl.Expr, prefixes: list[str], postfixes: list[str]) -> pl.Expr:
+    """
+    Strips all stacked prefixes and postfixes from a string expression.
+
+    Each side is a single anchored regex over the alternation of the terms,
+    which the regex engine compiles into one automaton, and the repetition
+    removes stacked terms in the same pass, so the result is a fixpoint:
+    stripping it again changes nothing.
+    """
+    if prefixes:
+        text = text.str.replace(prefix_pattern(prefixes), "")
+    if postfixes:
+        text = text.str.replace(postfix_pattern(postfixes), "")
+    return text
+
+
+def count_affixes(
+    texts: pl.Series, prefixes: list[str], postfixes: list[str]
+) -> pl.DataFrame:
+    """
+    Counts the texts starting or ending with each term, case-insensitively.
+
+    Each side scans the texts once to extract the run of stacked terms, and
+    the terms are then counted within the extracted runs only.
+
+    Returns:
+    pl.DataFrame: Columns "kind" ("prefix" or "postfix"), "term", "freq" and
+        "norm_freq", the frequency in percent of all texts.
+    """
+    frames = []
+    for kind, terms, pattern in [
+        ("prefix", prefixes, r"(?i)^(\s*(?:" + _alternation(prefixes) + r"\s*)+)"),
+        ("postfix", postfixes, r"(?i)((?:\s*" + _alternation(postfixes) + r")+)\s*$"),
+    ]:
+        if not terms:
+            continue
+        counts = (
+            texts.str.extract(pattern, 1)
+            .drop_nulls()
+            .str.to_lowercase()
+            .str.extract_all(_alternation([term.lower() for term in terms]))
+            .list.unique()
+            .explode()
+            .drop_nulls()
+            .value_counts()
+        )
+        frames.append(
+            pl.DataFrame({"kind": kind, "term": terms})
+            .with_columns(pl.col("term").str.to_lowercase().alias("_key"))
+            .join(
+                counts.rename({counts.columns[0]: "_key", counts.columns[1]: "freq"}),
+                on="_key",
+                how="left",
+            )
+            .drop("_key")
+        )
+
+    return (
+        pl.concat(frames)
+        .with_columns(pl.col("freq").fill_null(0).cast(pl.Int64))
+        .with_columns(
+            (pl.col("freq") / max(len(texts), 1) * 100).round(5).alias("norm_freq")
+        )
+    )
@@ -0,0 +1,213 @@
+import asyncio
+import os
+import random
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+from .config import config
+
+load_dotenv()
+
+# Status codes worth retrying: too many requests and server side errors. Any
+# other status, incl. 456 (character quota exceeded), is raised right away.
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+
+class DeepLError(Exception):
+    """Raised when DeepL rejects a request or retries are exhausted."""
+
+    def __init__(self, status_code: int | None, message: str):
+        super().__init__(f"Error: {status_code} - {message}")
+        self.status_code = status_code
+
+
+def backoff_delay(
+    attempt: int,
+    retry_after: str | None,
+    backoff_base: float = config.deepl_backoff_base,
+    backoff_max: float = config.deepl_backoff_max,
+) -> float:
+    """Jittered exponential backoff, at least the server's Retry-After seconds."""
+    delay = min(backoff_max, backoff_base * 2**attempt)
+    # Full jitter keeps concurrent workers from retrying in lockstep
+    delay = random.uniform(delay / 2, delay)
+    if retry_after is not None:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+class TokenBucket:
+    """
+    Asyncio token bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. A request
+    for more tokens than the capacity waits for a full bucket, so single large
+    requests are slowed down instead of blocked forever.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1.0):
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class AsyncDeepLTranslator:
+    """
+    Concurrent DeepL client sharing one keep-alive connection pool.
+
+    Use it as an async context manager to open the connection pool, and await
+    `translate_batches` inside it.
+
+    Args:
+        url (str): DeepL translate endpoint, e.g. a local mock server.
+        auth_key (str): DeepL API authentication key.
+        concurrency (int): Maximum number of requests in flight.
+        requests_per_second (float | None): Request rate limit, None for no limit.
+        chars_per_second (float | None): Character rate limit, None for no limit.
+        max_retries (int): Retries per request on 429, 5xx and connection errors.
+        backoff_base (float): Delay in seconds before the first retry.
+        backoff_max (float): Upper bound on the delay between retries.
+        source_lang (str | None): Source language code, None for auto detection.
+        formality (str | None): DeepL formality option, e.g. "prefer_less".
+        glossary_id (str | None): DeepL glossary to apply.
+    """
+
+    def __init__(
+        self,
+        url: str = config.deepl_url,
+        auth_key: str | None = None,
+        concurrency: int = config.deepl_concurrency,
+        requests_per_second: float | None = config.deepl_requests_per_second,
+        chars_per_second: float | None = config.deepl_chars_per_second,
+        max_retries: int = config.deepl_max_retries,
+        backoff_base: float = config.deepl_backoff_base,
+        backoff_max: float = config.deepl_backoff_max,
+        source_lang: str | None = None,
+        formality: str | None = None,
+        glossary_id: str | None = None,
+    ):
+        self.url = url
+        self.auth_key = (
+            auth_key if auth_key is not None else os.environ.get("DEEPL_API_KEY", "")
+        )
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.chars_per_second = chars_per_second
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.source_lang = source_lang
+        self.options = {
+            key: value
+            for key, value in {
+                "formality": formality,
+                "glossary_id": glossary_id,
+            }.items()
+            if value is not None
+        }
+        self.stats = {"requests": 0, "retries": 0, "texts": 0, "characters": 0}
+        self._session = None
+
+    async def __aenter__(self):
+        # Limiters are bound to the running event loop, so create them here
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._request_bucket = (
+            TokenBucket(self.requests_per_second) if self.requests_per_second else None
+        )
+        self._char_bucket = (
+            TokenBucket(self.chars_per_second) if self.chars_per_second else None
+        )
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            headers={"Authorization": f"DeepL-Auth-Key {self.auth_key}"},
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    def _backoff_delay(self, attempt: int, retry_after: str | None) -> float:
+        return backoff_delay(attempt, retry_after, self.backoff_base, self.backoff_max)
+
+    async def translate_batch(self, texts: list[str], target_lang: str) -> list[str]:
+        """Translates one batch of texts in a single request, retrying on failure."""
+        n_chars = sum(len(text) for text in texts)
+        data = {"text": texts, "target_lang": target_lang, **self.options}
+        if self.source_lang is not None:
+            data["source_lang"] = self.source_lang
+
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                if self._request_bucket is not None:
+                    await self._request_bucket.acquire()
+                if self._char_bucket is not None:
+                    await self._char_bucket.acquire(n_chars)
+
+                self.stats["requests"] += 1
+                retry_after = None
+                try:
+                    async with self._session.post(self.url, json=data) as response:
+                        if response.status == 200:
+                            body = await response.json()
+                            self.stats["texts"] += len(texts)
+                            self.stats["characters"] += n_chars
+                            return [t["text"] for t in body["translations"]]
+
+                        message = await response.text()
+                        if response.status not in RETRY_STATUS_CODES:
+                            raise DeepLError(response.status, message)
+                        error = DeepLError(response.status, message)
+                        retry_after = response.headers.get("Retry-After")
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = DeepLError(None, repr(e))
+
+                if attempt < self.max_retries:
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+
+        raise error
+
+    async def translate_batches(
+        self,
+        batches: list[list[str]],
+        target_lang: str,
+        return_exceptions: bool = False,
+    ) -> list[list[str] | Exception]:
+        """
+        Translates batches concurrently and returns them in input order.
+
+        Every batch runs to completion, also when another one fails. The first
+        error is then raised, or with `return_exceptions`, returned in place of
+        the failed batches, so the translated batches can still be kept.
+        """
+        results = await asyncio.gather(
+            *(self.translate_batch(batch, target_lang) for batch in batches),
+            return_exceptions=True,
+        )
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+        return results
@@ -0,0 +1,124 @@
+import polars as pl
+
+from .config import config
+
+
+def billable_characters(df: pl.DataFrame) -> pl.Series:
+    """
+    Characters billed by DeepL for each row.
+
+    System prompts are not included, `translate_system_prompts` translates
+    each unique system prompt once instead of once per row.
+    """
+    return df.select(
+        (pl.col("question").str.len_chars() + pl.col("response").str.len_chars())
+        .cast(pl.Int64)
+        .alias("billable_chars")
+    ).to_series()
+
+
+def system_prompt_characters(df: pl.DataFrame) -> int:
+    """Characters billed once for translating the unique system prompts."""
+    return df.select(pl.col("system_prompt").unique().str.len_chars().sum()).item()
+
+
+def plan_translation_budget(
+    df: pl.DataFrame,
+    max_budget_in_eur: float | None = None,
+    max_chars: int | None = None,
+    strata: tuple[str, ...] = ("source",),
+    quotas: pl.DataFrame | None = None,
+    value_column: str | None = None,
+    price_per_million_chars: float = config.deepl_price_per_million_chars,
+) -> pl.DataFrame:
+    """
+    Selects the rows to translate within a euro or character budget.
+
+    Rows are ranked within their stratum by value per billable character, the
+    cheapest first when no `value_column` is given, which maximizes the number
+    of rows. The strata are then filled at the same pace, row i of a stratum
+    with quota q coming in at i / q, and the longest prefix of that order that
+    fits the budget is selected. Each unique system prompt is billed once,
+    with the first selected row using it. Rows beyond the quota of their
+    stratum are never selected. Everything is sorts and cumulative sums, so it
+    scales to millions of rows.
+
+    Args:
+    df (pl.DataFrame): Examples to choose from, e.g. the stratified dataset.
+    max_budget_in_eur (float | None): Budget in euros.
+    max_chars (int | None): Budget in billable characters, used instead of
+        `max_budget_in_eur` when given. Without either, all rows within the
+        quotas are selected.
+    strata (tuple[str, ...]): Columns defining the strata.
+    quotas (pl.DataFrame | None): Maximum number of rows per stratum, with the
+        `strata` columns and a "quota" column. Defaults to the same quota, all
+        rows, for every stratum, so small strata are not filled faster.
+    value_column (str | None): Column with the value of each row, None to
+        count every row as 1.
+    price_per_million_chars (float): DeepL price in euros.
+
+    Returns:
+    pl.DataFrame: The selected rows, see `budget_report` for their cost.
+    """
+    if max_chars is None and max_budget_in_eur is not None:
+        max_chars = int(max_budget_in_eur / price_per_million_chars * 1_000_000)
+
+    strata = list(strata)
+    if quotas is None:
+        quotas = df.group_by(strata).agg(pl.lit(len(df)).alias("quota"))
+    value = pl.col(value_column) if value_column is not None else pl.lit(1.0)
+
+    selected = (
+        df.with_columns(billable_characters(df), value.cast(pl.Float64).alias("_value"))
+        .join(quotas.select(*strata, "quota"), on=strata)
+        .with_columns(
+            (pl.col("_value") / pl.col("billable_chars").clip(lower_bound=1)).alias(
+                "_value_per_char"
+            )
+        )
+        .with_columns(
+            pl.col("_value_per_char")
+            .rank("ordinal", descending=True)
+            .over(strata)
+            .alias("_rank")
+        )
+        .filter(pl.col("_rank") <= pl.col("quota"))
+        .sort(
+            [pl.col("_rank") / pl.col("quota"), "_value_per_char"],
+            descending=[False, True],
+        )
+        .with_columns(
+            pl.when(pl.col("system_prompt").is_first_distinct())
+            .then(pl.col("system_prompt").str.len_chars().cast(pl.Int64))
+            .otherwise(0)
+            .fill_null(0)
+            .alias("_system_prompt_chars")
+        )
+        .filter(
+            (pl.col("billable_chars") + pl.col("_system_prompt_chars")).cum_sum()
+            <= (max_chars if max_chars is not None else float("inf"))
+        )
+        .drop(
+            "_value",
+            "_value_per_char",
+            "_rank",
+            "quota",
+            "_system_prompt_chars",
+            "billable_chars",
+        )
+    )
+
+    return selected
+
+
+def budget_report(
+    selected: pl.DataFrame,
+    price_per_million_chars: float = config.deepl_price_per_million_chars,
+) -> dict:
+    """Billable characters and cost of translating the selected rows."""
+    n_chars = billable_characters(selected).sum() + system_prompt_characters(selected)
+    return {
+        "rows": len(selected),
+        "billable_characters": n_chars,
+        "cost_in_eur": n_chars / 1_000_000 * price_per_million_chars,
+    }
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import sqlite3
+import time
+import unicodedata
+from pathlib import Path
+
+from .config import config
+
+# SQLite limits the number of host parameters per statement
+_SQLITE_MAX_PARAMS = 500
+
+
+def normalize_text(text: str) -> str:
+    """Normalizes text before hashing, so trivially different inputs share a key."""
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def translation_key(
+    text: str,
+    target_lang: str,
+    source_lang: str | None = None,
+    options: dict | None = None,
+) -> bytes:
+    """
+    Content address of a translation.
+
+    Args:
+        text (str): The text to be translated.
+        target_lang (str): The target language code.
+        source_lang (str | None): The source language code, None for auto detection.
+        options (dict | None): Request options changing the output, e.g. formality
+            or glossary id.
+
+    Returns:
+        bytes: SHA-256 digest of the normalized text, languages and options.
+    """
+    payload = json.dumps(
+        [normalize_text(text), source_lang, target_lang, options or {}],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+class ContentAddressedCache:
+    """
+    Persistent content-addressed cache of texts backed by SQLite.
+
+    Lookups and writes are batched. When the stored values exceed
+    `max_bytes`, the least recently used entries are evicted. Their total size
+    is kept up to date by triggers in a "meta" row, so a write does not sum
+    the sizes of all entries. Subclasses name the table and the value column.
+
+    Args:
+        path (Path): SQLite database file.
+        max_bytes (int | None): Upper bound on the size of the stored values,
+            None for no bound.
+    """
+
+    table = "entries"
+    value_column = "value"
+
+    def __init__(self, path: Path, max_bytes: int | None = None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                key BLOB PRIMARY KEY,
+                {self.value_column} TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID
+            """)
+        self._connection.execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_last_used "
+            f"ON {self.table} (last_used)"
+        )
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+            """)
+        # Counts the entries of caches created before the running total once
+        self._connection.execute(
+            "INSERT OR IGNORE INTO meta (name, value) "
+            f"SELECT 'total_size', COALESCE(SUM(size), 0) FROM {self.table}"
+        )
+        for event, delta in [
+            ("INSERT", "NEW.size"),
+            ("DELETE", "-OLD.size"),
+            ("UPDATE OF size", "NEW.size - OLD.size"),
+        ]:
+            name = f"{self.table}_size_" + event.split()[0].lower()
+            self._connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {self.table}
+                BEGIN
+                    UPDATE meta SET value = value + {delta}
+                    WHERE name = 'total_size';
+                END
+                """)
+        self._connection.commit()
+
+    def __len__(self) -> int:
+        query = f"SELECT COUNT(*) FROM {self.table}"
+        return self._connection.execute(query).fetchone()[0]
+
+    def get_many(self, keys: list[bytes]) -> dict[bytes, str]:
+        """Looks up keys and returns the cached values of the hits."""
+        unique_keys = list(dict.fromkeys(keys))
+        found = {}
+        for i in range(0, len(unique_keys), _SQLITE_MAX_PARAMS):
+            chunk = unique_keys[i : i + _SQLITE_MAX_PARAMS]
+            placeholders = ",".join("?" * len(chunk))
+            query = (
+                f"SELECT key, {self.value_column} FROM {self.table} "
+                f"WHERE key IN ({placeholders})"
+            )
+            found.update(self._connection.execute(query, chunk))
+
+        if found:
+            now = time.time()
+            self._connection.executemany(
+                f"UPDATE {self.table} SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self._connection.commit()
+
+        n_hits = sum(key in found for key in keys)
+        self.stats["hits"] += n_hits
+        self.stats["misses"] += len(keys) - n_hits
+        return found
+
+    def put_many(self, items: dict[bytes, str]):
+        """Stores values by key and evicts old entries if the cache is full."""
+        if not items:
+            return
+        now = time.time()
+        # An upsert rather than INSERT OR REPLACE, whose implicit deletes do not
+        # fire the triggers maintaining the total size
+        self._connection.executemany(
+            f"INSERT INTO {self.table} (key, {self.value_column}, size, last_used) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            f"{self.value_column} = excluded.{self.value_column}, "
+            "size = excluded.size, last_used = excluded.last_used",
+            [
+                (key, value, len(value.encode("utf-8")), now)
+                for key, value in items.items()
+            ],
+        )
+        self.stats["writes"] += len(items)
+        self._evict()
+        self._connection.commit()
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        total_bytes = self._connection.execute(
+            "SELECT value FROM meta WHERE name = 'total_size'"
+        ).fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+
+        # Walk entries from least to most recently used until enough is freed
+        excess_bytes = total_bytes - self.max_bytes
+        evicted_keys = []
+        rows = self._connection.execute(
+            f"SELECT key, size FROM {self.table} ORDER BY last_used"
+        )
+        for key, size in rows:
+            if excess_bytes <= 0:
+                break
+            evicted_keys.append((key,))
+            excess_bytes -= size
+        self._connection.executemany(
+            f"DELETE FROM {self.table} WHERE key = ?", evicted_keys
+        )
+        self.stats["evictions"] += len(evicted_keys)
+
+    def close(self):
+        self._connection.close()
+
+
+class TranslationCache(ContentAddressedCache):
+    """Translations keyed by `translation_key`, see `ContentAddressedCache`."""
+
+    table = "translations"
+    value_column = "translation"
+
+    def __init__(
+        self,
+        path: Path = config.data_dir / config.translation_cache_file_name,
+        max_bytes: int | None = config.translation_cache_max_bytes,
+    ):
+        super().__init__(path, max_bytes)
+
+
+class CompletionCache(ContentAddressedCache):
+    """Completions keyed by `completion_key`, see `ContentAddressedCache`."""
+
+    table = "completions"
+    value_column = "completion"
+
+    def __init__(
+        self,
+        path: Path = config.data_dir / config.completion_cache_file_name,
+        max_bytes: int | None = None,
+    ):
+        super().__init__(path, max_bytes)
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import polars as pl
+
+from .config import config
+
+
+def checkpoint_directory(parent: Path, input_path: Path) -> Path:
+    """
+    Checkpoint directory for a job reading `input_path`, keyed to the file name
+    and content, so a checkpoint is only ever resumed for the same input.
+    """
+    digest = hashlib.sha256()
+    with open(input_path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return Path(parent) / f"{Path(input_path).stem}_{digest.hexdigest()[:16]}"
+
+
+class ShardedCheckpoint:
+    """
+    Append-only Parquet checkpoint for long running row-wise jobs.
+
+    Every call to `write_shard` writes a new small Parquet shard and appends a
+    line with the shard name and its row ids to `manifest.jsonl`. A shard only
+    counts as completed once its manifest line is written, so a crash halfway
+    through writing a shard loses at most that shard. Once the final output is
+    written, `remove` deletes the checkpoint so the next run starts fresh.
+
+    Args:
+        directory (Path): Directory holding the shards and the manifest.
+        resume (bool): Continue from existing shards. Without it, an existing
+            non-empty checkpoint raises instead of being mixed into a new run.
+    """
+
+    manifest_file_name = "manifest.jsonl"
+
+    def __init__(
+        self,
+        directory: Path = config.data_dir / config.translation_checkpoint_dir_name,
+        resume: bool = False,
+    ):
+        self.directory = Path(directory)
+        self.manifest_path = self.directory / self.manifest_file_name
+        if self.manifest_path.exists() and not resume:
+            raise FileExistsError(
+                f"Checkpoint already exists in {self.directory}. Resume from it "
+                "or remove the directory to start over."
+            )
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self.shard_names = []
+        self.completed_ids = set()
+        if self.manifest_path.exists():
+            with open(self.manifest_path, encoding="utf-8") as file:
+                for line in file:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    self.shard_names.append(entry["shard"])
+                    self.completed_ids.update(entry["ids"])
+
+    def remaining(self, df: pl.DataFrame) -> pl.DataFrame:
+        """Returns the rows of `df` whose ids are not in a completed shard."""
+        if not self.completed_ids:
+            return df
+        return df.filter(~pl.col("id").is_in(list(self.completed_ids)))
+
+    def write_shard(self, df: pl.DataFrame):
+        """Writes `df` as a new shard and records its ids in the manifest."""
+        shard_name = f"shard_{len(self.shard_names):06d}.parquet"
+        tmp_path = self.directory / f"{shard_name}.tmp"
+        df.write_parquet(tmp_path)
+        os.replace(tmp_path, self.directory / shard_name)
+
+        ids = df["id"].to_list()
+        with open(self.manifest_path, "a", encoding="utf-8") as file:
+            file.write(json.dumps({"shard": shard_name, "ids": ids}) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.shard_names.append(shard_name)
+        self.completed_ids.update(ids)
+
+    def read(self, ids: pl.Series | None = None) -> pl.DataFrame:
+        """
+        Concatenates the completed shards without copying them into one buffer.
+
+        Args:
+            ids (pl.Series | None): Only return the rows with these ids, e.g. the
+                ids of the current input, as a resumed checkpoint may hold rows
+                of an earlier input.
+        """
+        if not self.shard_names:
+            raise FileNotFoundError(f"No completed shards in {self.directory}")
+        shards = [pl.read_parquet(self.directory / name) for name in self.shard_names]
+        df = pl.concat(shards, rechunk=False)
+        if ids is not None:
+            df = df.filter(pl.col("id").is_in(ids))
+        return df
+
+    def remove(self):
+        """Deletes the shards and the manifest."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.shard_names = []
+        self.completed_ids = set()
@@ -11,13 +11,78 @@ class Config:
     sampled_dataset_file_name: str = "sampled_dataset.parquet"
     filtered_dataset_file_name: str = "filtered_dataset.parquet"
     stratified_dataset_file_name: str = "stratified_dataset.parquet"
+    budgeted_dataset_file_name: str = "budgeted_dataset.parquet"
     translated_dataset_file_name: str = "translated_dataset.parquet"
+    filter_evaluated_file_name: str = "filter_evaluated.parquet"  # with rule mask
+    filter_rejections_file_name: str = "filter_rejections.parquet"
+    filter_profile_file_name: str = "filter_profile.ndjson"  # per-step report
+    benchmark_results_file_name: str = "benchmark_results.ndjson"
+    benchmark_sizes: list[int] = [10_000, 1_000_000, 5_000_000]  # synthetic rows
+    sample_batch_size: int = 10000  # rows per row group when sampling
+    script_count_chunk_size: int = 10000  # rows per chunk when counting scripts
+    tokenizer_encoding: str = "cl100k_base"  # tiktoken encoding for token counts
+    token_count_threads: int = 8
+    token_count_chunk_size: int = 10000  # texts per encode_ordinary_batch call
+    max_example_tokens: int | None = 2048  # question + response, None disables
+    allowed_scripts: list[str] = ["Latin", "Greek"]  # Greek for math symbols
+    max_foreign_script_ratio: float = 0.01  # of letters outside allowed_scripts
+    translated_id_index_name: str = "translated_ids"  # .npy hashes + .parquet ids
+    translated_id_index_max_deltas: int = 16  # added deltas merged into the base
+    translation_checkpoint_dir_name: str = "translation_checkpoint"
+    translation_cache_file_name: str = "translation_cache.sqlite"
+    translation_cache_max_bytes: int | None = 2 * 1024**3  # None disables eviction
+    translate_segments: bool = False  # sentence-level translation memory
+    translation_stats_file_name: str = "translation_stats.ndjson"  # per run
+    translate_templates: bool = False  # translate shared question scaffolds once
+    template_min_count: int = 100  # questions sharing a scaffold
+    template_min_chars: int = 10
+    question_templates_file_name: str = "question_templates.parquet"
+    template_validation_file_name: str = "template_validation.parquet"
+    translation_retry_queue_file_name: str = "translation_retry_queue.parquet"
+    translation_rejected_file_name: str = "translation_rejected.parquet"
+    translation_max_retry_attempts: int = 3  # --retry runs before a row is rejected
+    translation_length_ratio_bounds: list[float] = [0.5, 2.0]  # Danish / English
+    translation_check_min_chars: int = 20  # shorter sources skip ratio checks
+    max_english_word_ratio: float = 0.2  # English function words in translations
+    deepl_url: str = "https://api.deepl.com/v2/translate"
+    deepl_concurrency: int = 8  # number of DeepL requests in flight
+    deepl_requests_per_second: float | None = 10.0  # None disables the limit
+    deepl_chars_per_second: float | None = None  # None disables the limit
+    deepl_max_retries: int = 6  # retries on 429, 5xx and connection errors
+    deepl_backoff_base: float = 1.0  # seconds before the first retry
+    deepl_backoff_max: float = 60.0  # upper bound on seconds between retries
+    deepl_price_per_million_chars: float = 20.0  # EUR
+    translation_budget_in_eur: float | None = None  # None selects all examples
+    translation_budget_chars: int | None = None  # used instead of the EUR budget
+    deepl_max_texts_per_request: int = 50  # DeepL limit on texts per request
+    deepl_max_request_bytes: int = 128 * 1024  # DeepL limit on request body size
+    master_dataset_dir_name: str = "master_dataset"  # local shards of the hub dataset
+    master_dataset_repo_id: str = "kobprof/skolegpt-instruct"
+    survey_questions_file_name: str = "survey_questions.txt"
+    survey_instructions_file_name: str = "skolegpt_survey_instructions.parquet"
+    generation_checkpoint_dir_name: str = "generation_checkpoint"
+    completion_cache_file_name: str = "completion_cache.sqlite"
+    completion_url: str = "https://api.openai.com/v1/chat/completions"
+    completion_model: str = "gpt-4-0125-preview"
+    completion_temperature: float = 0.7
+    completion_concurrency: int = 8  # number of completion requests in flight
+    completion_max_retries: int = 6  # retries on 429, 5xx and connection errors
+    disabled_filter_rules: list[str] = []  # names from filtering.FILTER_RULES
+    near_dedup_enabled: bool = True  # MinHash/LSH near-duplicate question removal
+    near_duplicate_threshold: float = 0.8  # min. estimated Jaccard similarity
+    minhash_num_permutations: int = 128
+    minhash_bands: int = 16  # LSH bands, num_permutations must be divisible by it
+    minhash_shingle_size: int = 3  # words per shingle
+    minhash_chunk_size: int = 10000  # rows per chunk when computing signatures
     instruction_sources: list[str] = [
         "flan",
         "niv",
         "t0",
         "cot",
     ]  # instuction example sources
+    stratification_keys: list[str] = ["source"]  # e.g. question_token_bucket
+    question_length_buckets: list[int] = [200, 500, 1000, 2000]  # char breaks
+    question_token_buckets: list[int] = [50, 125, 250, 500]  # token breaks
     common_prefixes: list[str] = [
         "Question:",
         "Definition:",
@@ -1,27 +1,190 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
 import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datasets import load_dataset
 
+from .config import config
+
 
-def get_data(n_max: int, seed: int = 42) -> pl.DataFrame:
+def get_data(
+    n_max: int,
+    seed: int = 42,
+    source_path: Path | None = None,
+) -> pl.DataFrame:
     """Data extraction pipeline."""
+    return pl.concat(iter_sampled_batches(n_max, seed=seed, source_path=source_path))
 
-    ds = load_dataset(
-        "Open-Orca/OpenOrca",
-        streaming=True,
-        split="train",
-        data_files="1M-GPT4-Augmented.parquet",
-    )
+
+def write_sampled_data(
+    output_path: Path,
+    n_max: int,
+    seed: int = 42,
+    source_path: Path | None = None,
+) -> int:
+    """
+    Data extraction pipeline writing straight to Parquet.
+
+    Each sampled batch is written as a row group as soon as it arrives, so
+    memory stays flat and independent of `n_max`.
+
+    Returns:
+    int: The number of sampled rows written.
+    """
+    n_rows = 0
+    writer = None
+    try:
+        for batch in iter_sampled_batches(n_max, seed=seed, source_path=source_path):
+            table = batch.to_arrow()
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+            n_rows += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+
+def iter_sampled_batches(
+    n_max: int,
+    seed: int = 42,
+    source_path: Path | None = None,
+    batch_size: int = config.sample_batch_size,
+) -> Iterator[pl.DataFrame]:
+    """
+    Streams a shuffled sample of exactly `n_max` OpenOrca examples in batches.
+
+    Args:
+    n_max (int): Number of examples to sample.
+    seed (int): Seed of the shuffle.
+    source_path (Path | None): Local copy of "1M-GPT4-Augmented.parquet" to
+        sample from instead of the Hugging Face hub.
+    batch_size (int): Number of examples per batch.
+
+    Yields:
+    pl.DataFrame: Batches of examples with an added "source" column, a single
+        empty batch for an empty source.
+    """
+    if source_path is not None:
+        ds = load_dataset(
+            "parquet",
+            streaming=True,
+            split="train",
+            data_files=str(source_path),
+        )
+    else:
+        ds = load_dataset(
+            "Open-Orca/OpenOrca",
+            streaming=True,
+            split="train",
+            data_files="1M-GPT4-Augmented.parquet",
+        )
     ds = ds.shuffle(seed=seed)
 
-    examples = []
-    for example in ds:
-        examples.append(example)
-        if len(examples) > n_max:
+    n_remaining = n_max
+    is_empty = True
+    # Arrow batches where datasets supports them through the shuffle buffer,
+    # older versions yield dicts of lists, both of which pl.DataFrame accepts
+    for batch in ds.with_format("arrow").iter(batch_size=batch_size):
+        df = pl.DataFrame(batch).head(n_remaining)
+        n_remaining -= len(df)
+        is_empty = False
+
+        # add source column
+        yield df.with_columns(pl.col("id").str.split(".").list.first().alias("source"))
+
+        if n_remaining <= 0:
             break
 
-    df = pl.DataFrame(examples)
+    if is_empty:
+        # Empty source, an empty batch keeps the schema of the output
+        df = pl.DataFrame(ds.features.arrow_schema.empty_table())
+        yield df.with_columns(pl.col("id").str.split(".").list.first().alias("source"))
+
+
+def get_data_from_row_groups(
+    source_path: Path,
+    n_max: int,
+    seed: int = 42,
+    n_workers: int | None = None,
+    columns: list[str] | None = None,
+) -> pl.DataFrame:
+    """
+    Exact seeded sample of a local Parquet file, read in parallel.
+
+    The row indices are drawn up front, so the sample is a uniform random
+    sample without replacement in random order. Only the row groups holding
+    sampled rows are read, restricted to `columns`, by a pool of processes.
+    Rows are put back in sampled order afterwards, so the result only depends
+    on the file and the seed, not on `n_workers`.
+
+    Args:
+    source_path (Path): Local copy of "1M-GPT4-Augmented.parquet".
+    n_max (int): Number of examples to sample, capped at the number of rows.
+    seed (int): Seed of the sampler.
+    n_workers (int | None): Number of processes, None for one per CPU.
+    columns (list[str] | None): Columns to read, None for all.
+
+    Returns:
+    pl.DataFrame: The sampled examples with an added "source" column.
+    """
+    parquet_file = pq.ParquetFile(source_path)
+    metadata = parquet_file.metadata
+    row_group_offsets = np.cumsum(
+        [0] + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    )
+
+    indices = sample_row_indices(metadata.num_rows, n_max, seed)
+    order = np.argsort(indices, kind="stable")
+    sorted_indices = indices[order]
+    row_groups = np.searchsorted(row_group_offsets, sorted_indices, side="right") - 1
+
+    tasks = []
+    for row_group in np.unique(row_groups):
+        local_indices = (
+            sorted_indices[row_groups == row_group] - row_group_offsets[row_group]
+        )
+        tasks.append((str(source_path), int(row_group), local_indices, columns))
+
+    if not tasks:
+        # Nothing sampled, e.g. n_max=0 or an empty file
+        schema = parquet_file.schema_arrow
+        if columns is not None:
+            schema = pa.schema([schema.field(column) for column in columns])
+        tables = [schema.empty_table()]
+    elif n_workers == 1:
+        tables = [take_from_row_group(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            tables = list(executor.map(take_from_row_group, *zip(*tasks)))
+
+    # Rows arrive sorted by index, put them back in sampled order
+    inverse_order = np.empty_like(order)
+    inverse_order[order] = np.arange(len(order))
+    df = pl.from_arrow(pa.concat_tables(tables))
+    df = df.select(pl.all().gather(pl.Series(inverse_order)))
 
     # add source column
-    df = df.with_columns(pl.col("id").apply(lambda x: x.split(".")[0]).alias("source"))
+    return df.with_columns(pl.col("id").str.split(".").list.first().alias("source"))
+
+
+def sample_row_indices(n_rows: int, n: int, seed: int = 42) -> np.ndarray:
+    """Draws min(n, n_rows) distinct row indices in random order."""
+    rng = np.random.default_rng(seed)
+    return rng.choice(n_rows, size=min(n, n_rows), replace=False, shuffle=True)
+
 
-    return df
+def take_from_row_group(
+    source_path: str,
+    row_group: int,
+    local_indices: np.ndarray,
+    columns: list[str] | None = None,
+) -> pa.Table:
+    """Reads one row group and returns the rows at `local_indices`."""
+    table = pq.ParquetFile(source_path).read_row_group(row_group, columns=columns)
+    return table.take(pa.array(local_indices))
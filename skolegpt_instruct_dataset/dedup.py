@@ -0,0 +1,182 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import polars as pl
+
+from .config import config
+
+# Multipliers used to combine consecutive token hashes into one shingle hash
+_SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_BAND_MULTIPLIER = np.uint64(0xBF58476D1CE4E5B9)
+
+logger = logging.getLogger(__name__)
+
+
+def minhash_signatures(
+    texts: pl.Series,
+    num_permutations: int = config.minhash_num_permutations,
+    shingle_size: int = config.minhash_shingle_size,
+    seed: int = config.seed,
+    chunk_size: int = config.minhash_chunk_size,
+    n_workers: int | None = None,
+) -> np.ndarray:
+    """
+    Computes MinHash signatures of word shingles.
+
+    Texts are lowercased and split into words, consecutive words are combined
+    into shingles of `shingle_size` words, and each of the `num_permutations`
+    hash functions keeps its minimum over the shingles of a text. Chunks of
+    rows are processed by a thread pool, numpy releases the GIL while hashing.
+
+    Returns:
+    np.ndarray: Signatures of shape (len(texts), num_permutations).
+    """
+    rng = np.random.default_rng(seed)
+    # Multiply-add-shift hash family over 32 bit shingle hashes
+    a = rng.integers(1, 2**63, size=num_permutations, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, size=num_permutations, dtype=np.uint64)
+
+    def signatures_of_chunk(offset: int) -> np.ndarray:
+        chunk = texts.slice(offset, chunk_size)
+        shingles, starts = _shingle_hashes(chunk, shingle_size, seed, offset)
+        signatures = np.empty((len(chunk), num_permutations), dtype=np.uint32)
+        with np.errstate(over="ignore"):
+            for i in range(num_permutations):
+                hashed = (a[i] * shingles + b[i]) >> np.uint64(32)
+                signatures[:, i] = np.minimum.reduceat(hashed, starts)
+        return signatures
+
+    offsets = range(0, len(texts), chunk_size)
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        chunks = list(executor.map(signatures_of_chunk, offsets))
+    if not chunks:
+        return np.empty((0, num_permutations), dtype=np.uint32)
+    return np.concatenate(chunks)
+
+
+def _shingle_hashes(
+    texts: pl.Series, shingle_size: int, seed: int, row_offset: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the flat 32 bit shingle hashes of all texts and the start of each row.
+
+    Texts with fewer words than `shingle_size` get a single shingle of all their
+    words. Texts without words get a shingle unique to their row, so they are
+    never considered duplicates of each other.
+    """
+    tokens = texts.str.to_lowercase().str.extract_all(r"\w+")
+    n_tokens = tokens.list.len().fill_null(0).to_numpy().astype(np.int64)
+    token_hashes = (
+        tokens.explode().drop_nulls().hash(seed=seed).to_numpy().astype(np.uint64)
+    )
+
+    token_starts = np.zeros(len(n_tokens), dtype=np.int64)
+    np.cumsum(n_tokens[:-1], out=token_starts[1:])
+    n_shingles = np.maximum(n_tokens - shingle_size + 1, 1)
+    starts = np.zeros(len(n_tokens), dtype=np.int64)
+    np.cumsum(n_shingles[:-1], out=starts[1:])
+
+    # Position of the first token of every shingle, and how many tokens it spans
+    row_of_shingle = np.repeat(np.arange(len(n_tokens)), n_shingles)
+    first_token = token_starts[row_of_shingle] + (
+        np.arange(n_shingles.sum()) - starts[row_of_shingle]
+    )
+    span = np.minimum(n_tokens[row_of_shingle], shingle_size)
+
+    shingles = np.zeros(len(first_token), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k in range(shingle_size):
+            in_span = k < span
+            shingles[in_span] = (
+                shingles[in_span] * _SHINGLE_MULTIPLIER
+                + token_hashes[first_token[in_span] + k]
+            )
+        empty = n_tokens[row_of_shingle] == 0
+        shingles[empty] = (
+            row_of_shingle[empty].astype(np.uint64) + np.uint64(row_offset)
+        ) * _SHINGLE_MULTIPLIER
+    return shingles >> np.uint64(32), starts
+
+
+def near_duplicate_clusters(
+    signatures: np.ndarray,
+    n_bands: int = config.minhash_bands,
+    threshold: float = config.near_duplicate_threshold,
+) -> np.ndarray:
+    """
+    Clusters near-duplicates with LSH banding.
+
+    Rows sharing a band bucket become candidate pairs with the first row of the
+    bucket. Candidates whose estimated Jaccard similarity, the fraction of equal
+    signature values, reaches `threshold` are joined into clusters.
+
+    Returns:
+    np.ndarray: Cluster label of each row, the index of its first member.
+    """
+    n_rows, num_permutations = signatures.shape
+    rows_per_band = num_permutations // n_bands
+    row_idx = np.arange(n_rows)
+
+    edges = []
+    for band in range(n_bands):
+        band_values = signatures[:, band * rows_per_band : (band + 1) * rows_per_band]
+        keys = np.zeros(n_rows, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for column in band_values.T:
+                keys = keys * _BAND_MULTIPLIER + column.astype(np.uint64)
+        # A stable sort groups equal keys with their first row leading the group
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        is_group_start = np.empty(n_rows, dtype=bool)
+        is_group_start[:1] = True
+        is_group_start[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        first = order[np.flatnonzero(is_group_start)][np.cumsum(is_group_start) - 1]
+        members = ~is_group_start
+        edges.append(order[members] * n_rows + first[members])
+
+    labels = row_idx.copy()
+    edges = np.unique(np.concatenate(edges)) if edges else np.empty(0, np.int64)
+    if len(edges) == 0:
+        return labels
+    edges = np.stack([edges // n_rows, edges % n_rows], axis=1)
+
+    similarity = (signatures[edges[:, 0]] == signatures[edges[:, 1]]).mean(axis=1)
+    u, v = edges[similarity >= threshold].T
+
+    # Connected components by min-label propagation with pointer jumping
+    while True:
+        previous = labels.copy()
+        smallest = np.minimum(labels[u], labels[v])
+        np.minimum.at(labels, u, smallest)
+        np.minimum.at(labels, v, smallest)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def remove_near_duplicates(
+    df: pl.DataFrame,
+    column: str = "question",
+    threshold: float = config.near_duplicate_threshold,
+    num_permutations: int = config.minhash_num_permutations,
+    n_bands: int = config.minhash_bands,
+    shingle_size: int = config.minhash_shingle_size,
+) -> pl.DataFrame:
+    """Keeps the first row of every cluster of near-duplicates in `column`."""
+    signatures = minhash_signatures(
+        df[column], num_permutations=num_permutations, shingle_size=shingle_size
+    )
+    labels = near_duplicate_clusters(signatures, n_bands=n_bands, threshold=threshold)
+
+    cluster_sizes = np.bincount(labels, minlength=len(labels))
+    n_clusters = int((cluster_sizes > 1).sum())
+    n_removed = len(labels) - int((cluster_sizes > 0).sum())
+    logger.info(
+        "Found %d near-duplicate clusters in '%s', removing %d rows.",
+        n_clusters,
+        column,
+        n_removed,
+    )
+
+    return df.filter(pl.Series(labels == np.arange(len(labels))))
@@ -1,30 +1,54 @@
-import re
+import warnings
+from typing import Callable
 
-import datasets
+import numpy as np
 import polars as pl
 
-from .utils import return_filter_char_list
+from .affixes import strip_affixes
+from .config import config
+from .dedup import remove_near_duplicates
+from .id_index import TranslatedIdIndex
+from .profiling import StepProfiler
+from .tokens import TOKEN_COLUMNS, add_token_counts, token_count
+from .unicode_scripts import SCRIPT_RATIO_COLUMNS, add_script_ratios
+
+# Characters stripped by Python's str.strip(), which also includes control
+# characters outside of the Unicode White_Space property
+PYTHON_WHITESPACE = (
+    "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003"
+    "\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+)
 
 
 def filter_data(
     df: pl.DataFrame,
     common_prefixes: list[str],
     common_postfixes: list[str],
+    profiler: StepProfiler | None = None,
+    profile_rules: bool = False,
 ) -> pl.DataFrame:
-    """Data filtering pipeline."""
+    """
+    Data filtering pipeline.
+
+    The filter rules are evaluated together into a rejection mask, the number of
+    rows rejected by every rule is printed, and the rows rejected by an enabled
+    rule are dropped before the duplicate removal steps. With a profiler, the
+    time, memory and row counts of every step are recorded, and with
+    `profile_rules` also those of every filter rule, see `profile_filter_rules`.
+    """
 
     original_dataset_size = len(df)
     print(
         "Starting filter_data function. Original dataset size:", original_dataset_size
     )
-    df = remove_already_translated_instructions(df)
-    df = remove_translation_instructions(df)
-    df = remove_common_pre_postfixes(df, common_prefixes, common_postfixes)
-    df = remove_questions_ending_with_colon(df)
-    df = remove_multiple_choice_questions(df)
-    df = basic_cleaning(df)
-    df = remove_exotic_chars(df)
-    df = remove_duplicate_questions_and_responses(df)
+    for step, func in filter_steps(common_prefixes, common_postfixes):
+        if step == "evaluate_filter_rules" and profile_rules and profiler is not None:
+            profile_filter_rules(df, profiler)
+        df = profiler.run(step, func, df) if profiler is not None else func(df)
+        if step == "evaluate_filter_rules":
+            print(rejection_reasons(df))
+    if profiler is not None:
+        print(profiler.table())
 
     percent_removed = round(100 * (1 - len(df) / original_dataset_size), 4)
     print(f"{percent_removed} % of dataset removed after preprocessing.")
@@ -32,49 +56,216 @@ def filter_data(
     return df
 
 
-# ---------------------------------------------------------------------------- #
-#                              Preprocessing Steps                             #
-# ---------------------------------------------------------------------------- #
+def filter_steps(
+    common_prefixes: list[str],
+    common_postfixes: list[str],
+) -> list[tuple[str, Callable]]:
+    """The named steps of the filtering pipeline, in order."""
+    return rule_evaluation_steps(common_prefixes, common_postfixes) + selection_steps()
 
 
-def remove_already_translated_instructions(df: pl.DataFrame) -> pl.DataFrame:
-    def get_already_translated_ids():
-        try:
-            ds = datasets.load_dataset("kobprof/skolegpt-instruct")
-            ids = ds["train"]["id"]
-        except:
-            ids = []
-        return ids
+def rule_evaluation_steps(
+    common_prefixes: list[str],
+    common_postfixes: list[str],
+) -> list[tuple[str, Callable]]:
+    """
+    Steps cleaning the text and adding the token counts, the script ratios and
+    the rejection mask, dropping no rows.
+    """
+    return [
+        (
+            "clean_text",
+            lambda df: clean_text(df, common_prefixes, common_postfixes),
+        ),
+        ("count_tokens", add_token_counts),
+        ("profile_scripts", add_script_ratios),
+        ("evaluate_filter_rules", evaluate_filter_rules),
+    ]
 
-    already_translated_ids = get_already_translated_ids()
 
-    df = df.filter(~df["id"].is_in(already_translated_ids))
+def selection_steps(
+    disabled_rules: list[str] = config.disabled_filter_rules,
+) -> list[tuple[str, Callable]]:
+    """Steps dropping the rejected rows and the duplicates among the rest."""
+    steps = [("apply_filter_rules", lambda df: apply_filter_rules(df, disabled_rules))]
+    if config.near_dedup_enabled:
+        steps.append(
+            ("remove_near_duplicate_questions", remove_near_duplicate_questions)
+        )
+    steps.append(
+        (
+            "remove_duplicate_questions_and_responses",
+            remove_duplicate_questions_and_responses,
+        )
+    )
+    return steps
 
-    return df
 
+# ---------------------------------------------------------------------------- #
+#                                 Filter Rules                                 #
+# ---------------------------------------------------------------------------- #
 
-def remove_translation_instructions(df):
-    # Hard filter on "translate"
-    df = df.filter(~df["question"].str.to_lowercase().str.contains("translate"))
-    return df
+# Rule names in the order of their bit in the rejection mask
+FILTER_RULES = [
+    "already_translated",
+    "translation_instruction",
+    "ends_with_colon",
+    "multiple_choice",
+    "empty_question",
+    "empty_response",
+    "foreign_script",
+    "too_many_tokens",
+]
+REJECTION_MASK = "rejection_mask"
+
+# Columns added to evaluate the rules, dropped together with the rejected rows
+RULE_COLUMNS = [
+    REJECTION_MASK,
+    *TOKEN_COLUMNS.values(),
+    *SCRIPT_RATIO_COLUMNS.values(),
+]
+
+
+def filter_rules(
+    index: TranslatedIdIndex | None = None,
+    max_tokens: int | None = config.max_example_tokens,
+    max_foreign_script_ratio: float = config.max_foreign_script_ratio,
+) -> dict[str, pl.Expr]:
+    """Boolean expressions that are true for the rows rejected by each rule."""
+    question, response = pl.col("question"), pl.col("response")
+    rules = {
+        "already_translated": is_already_translated(index),
+        "translation_instruction": is_translation_instruction(),
+        "ends_with_colon": ends_with_colon(),
+        "multiple_choice": is_multiple_choice(),
+        "empty_question": question == "",
+        "empty_response": response == "",
+        "foreign_script": has_foreign_script(max_foreign_script_ratio),
+        "too_many_tokens": has_too_many_tokens(max_tokens),
+    }
+    return {name: rules[name] for name in FILTER_RULES}
+
+
+def evaluate_filter_rules(
+    df: pl.DataFrame | pl.LazyFrame,
+    index: TranslatedIdIndex | None = None,
+    max_tokens: int | None = config.max_example_tokens,
+    max_foreign_script_ratio: float = config.max_foreign_script_ratio,
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Adds a bitmask of the rules rejecting each row as a "rejection_mask" column.
+
+    All rules are evaluated in one `with_columns` pass, in which Polars runs the
+    expressions in parallel, and no rows are dropped. Bit i is set if rule
+    `FILTER_RULES[i]` rejects the row, a null result counts as a rejection, as
+    `filter` drops such rows too. The token limit and the script ratio need the
+    columns added by `add_token_counts` and `add_script_ratios`.
+    """
+    rules = filter_rules(
+        index=index,
+        max_tokens=max_tokens,
+        max_foreign_script_ratio=max_foreign_script_ratio,
+    )
+    mask = pl.sum_horizontal(
+        pl.when(rule.fill_null(True))
+        .then(pl.lit(1 << bit, dtype=pl.UInt16))
+        .otherwise(pl.lit(0, dtype=pl.UInt16))
+        for bit, rule in enumerate(rules.values())
+    )
+    return df.with_columns(mask.cast(pl.UInt16).alias(REJECTION_MASK))
+
+
+def profile_filter_rules(df: pl.DataFrame, profiler: StepProfiler):
+    """
+    Evaluates every filter rule on its own as a "rule_<name>" step.
+
+    `evaluate_filter_rules` runs all rules in one pass, which hides the cost of
+    the single rules, so this evaluates them once more, one at a time. `df`
+    needs the columns added by `add_token_counts` and `add_script_ratios`.
+    """
+    for name, rule in filter_rules().items():
+        profiler.run(f"rule_{name}", lambda df, rule=rule: df.select(rule), df)
+
+
+def apply_filter_rules(
+    df: pl.DataFrame | pl.LazyFrame,
+    disabled_rules: list[str] = config.disabled_filter_rules,
+) -> pl.DataFrame | pl.LazyFrame:
+    """Drops the rows rejected by any enabled rule and the `RULE_COLUMNS`."""
+    unknown_rules = set(disabled_rules) - set(FILTER_RULES)
+    if unknown_rules:
+        raise ValueError(
+            f"Unknown filter rules {sorted(unknown_rules)}, "
+            f"expected some of {FILTER_RULES}."
+        )
+    enabled_bits = sum(
+        1 << bit for bit, name in enumerate(FILTER_RULES) if name not in disabled_rules
+    )
+    return df.filter((pl.col(REJECTION_MASK) & enabled_bits) == 0).drop(RULE_COLUMNS)
+
+
+def rejection_reasons(df: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+    """
+    Number of rows rejected by each rule, from the rejection mask.
+
+    "rejected" counts all rows a rule rejects, "rejected_only_by_rule" the rows
+    no other rule rejects, so the difference is the overlap with other rules.
+    """
+    mask = pl.col(REJECTION_MASK)
+    counts = df.select(
+        pl.len().alias("_rows"),
+        *[
+            ((mask & (1 << bit)) != 0).sum().alias(name)
+            for bit, name in enumerate(FILTER_RULES)
+        ],
+        *[
+            (mask == (1 << bit)).sum().alias(f"{name}_only")
+            for bit, name in enumerate(FILTER_RULES)
+        ],
+    )
+    if isinstance(counts, pl.LazyFrame):
+        counts = counts.collect(streaming=True)
+    counts = counts.row(0, named=True)
+
+    return pl.DataFrame(
+        {
+            "rule": FILTER_RULES,
+            "rejected": [counts[name] for name in FILTER_RULES],
+            "rejected_only_by_rule": [counts[f"{name}_only"] for name in FILTER_RULES],
+        }
+    ).with_columns(
+        (pl.col("rejected") / max(counts["_rows"], 1) * 100)
+        .round(4)
+        .alias("percent_rejected")
+    )
 
 
-def remove_common_pre_postfixes(df, common_prefixes, common_postfixes):
-    prefix_pattern = r"^(?:" + "|".join(re.escape(p) for p in common_prefixes) + ")"
-    postfix_pattern = r"(?:" + "|".join(re.escape(p) for p in common_postfixes) + ")$"
-    df = df.with_columns(
-        df["question"].str.replace_all(prefix_pattern, "").alias("question")
-    )
-    return df.with_columns(
-        df["question"].str.replace_all(postfix_pattern, "").alias("question")
+def is_already_translated(index: TranslatedIdIndex | None = None) -> pl.Expr:
+    # Look ids up in the local index of translated ids, a missing index counts
+    # as empty, with a warning as every row is then kept for translation
+    index = index if index is not None else TranslatedIdIndex()
+    if not index.exists():
+        warnings.warn(
+            f"No translated id index found at {index.path}, no rows are removed "
+            "as already translated. Build it with "
+            "`python -m skolegpt_instruct_dataset.id_index`.",
+            stacklevel=2,
+        )
+    return pl.col("id").map_batches(
+        index.contains, return_dtype=pl.Boolean, is_elementwise=True
     )
 
 
-def remove_questions_ending_with_colon(df):
-    return df.filter(~df["question"].map_elements(lambda x: x.strip().endswith(":")))
+def is_translation_instruction() -> pl.Expr:
+    # Hard filter on "translate"
+    return pl.col("question").str.to_lowercase().str.contains("translate")
+
+
+def ends_with_colon() -> pl.Expr:
+    return pl.col("question").str.strip_chars(PYTHON_WHITESPACE).str.ends_with(":")
 
 
-def remove_multiple_choice_questions(df):
+def is_multiple_choice() -> pl.Expr:
     option_patterns = [
         r"(?i)\b[A-D]\)",  # Matches A), B), C), D) in a case-insensitive manner
         r"(?i)\b[1-4]\)",  # Matches 1), 2), 3), 4) in a case-insensitive manner
@@ -86,51 +277,78 @@ def remove_multiple_choice_questions(df):
         r"\b[i]+\.",  # Matches ii., iii., iv., etc.
     ]
     combined_option_pattern = "|".join(option_patterns)
-    condition = (
-        df["question"].str.contains("Options:")
-        | df["question"].str.contains("OPT:")
-        | df["question"].str.contains("OPTIONS:")
-    ) | df["question"].str.contains(combined_option_pattern)
-    return df.filter(~condition)
+    return (
+        pl.col("question").str.contains("Options:")
+        | pl.col("question").str.contains("OPT:")
+        | pl.col("question").str.contains("OPTIONS:")
+    ) | pl.col("question").str.contains(combined_option_pattern)
 
 
-def basic_cleaning(df):
-    df = df.with_columns(
-        [
-            df["system_prompt"].str.strip_chars(),
-            df["question"].str.strip_chars(),
-            df["response"].str.strip_chars(),
-        ]
+def has_foreign_script(max_ratio: float) -> pl.Expr:
+    # Too many letters outside Config.allowed_scripts in the question or response
+    return (pl.col("question_foreign_script_ratio") > max_ratio) | (
+        pl.col("response_foreign_script_ratio") > max_ratio
     )
-    df = df.filter(df["question"] != "")
-    df = df.filter(df["response"] != "")
-    return df
 
 
-def remove_exotic_chars(df: pl.DataFrame) -> pl.DataFrame:
-    # Filter questions and responses with exotic chars
-    def contains_characters(text, characters):
-        for char in characters:
-            if char in text:
-                return True
-        return False
+def has_too_many_tokens(max_tokens: int | None) -> pl.Expr:
+    if max_tokens is None:
+        return pl.lit(False)
+    # Too long to train on, so not worth paying to translate
+    return (
+        pl.col("question_tokens").cast(pl.Int64)
+        + pl.col("response_tokens").cast(pl.Int64)
+    ) > max_tokens
 
-    filter_chars = return_filter_char_list(df=df)
 
-    df = df.filter(
-        ~df["question"].map_elements(
-            lambda x: contains_characters(text=x, characters=filter_chars)
-        )
+# ---------------------------------------------------------------------------- #
+#                              Preprocessing Steps                             #
+# ---------------------------------------------------------------------------- #
+
+
+def clean_text(
+    df: pl.DataFrame | pl.LazyFrame,
+    common_prefixes: list[str],
+    common_postfixes: list[str],
+) -> pl.DataFrame | pl.LazyFrame:
+    # Strip the common pre- and postfixes and surrounding whitespace
+    df = remove_common_pre_postfixes(df, common_prefixes, common_postfixes)
+    return strip_text_columns(df)
+
+
+def remove_common_pre_postfixes(df, common_prefixes, common_postfixes):
+    # Strips stacked prefixes and postfixes, e.g. "Teacher: Question:", in one pass
+    return df.with_columns(
+        strip_affixes(pl.col("question"), common_prefixes, common_postfixes)
     )
-    df = df.filter(
-        ~df["response"].map_elements(
-            lambda x: contains_characters(text=x, characters=filter_chars)
-        )
+
+
+def strip_text_columns(df):
+    return df.with_columns(
+        [
+            pl.col("system_prompt").str.strip_chars(),
+            pl.col("question").str.strip_chars(),
+            pl.col("response").str.strip_chars(),
+        ]
     )
-    return df
 
 
-def remove_duplicate_questions_and_responses(df: pl.DataFrame) -> pl.DataFrame:
+def remove_near_duplicate_questions(
+    df: pl.DataFrame | pl.LazyFrame,
+) -> pl.DataFrame | pl.LazyFrame:
+    # Remove paraphrased and templated questions with MinHash/LSH
+    if isinstance(df, pl.LazyFrame):
+        # Only the ids and questions are collected to find the clusters
+        kept = remove_near_duplicates(
+            df.select("id", "question").collect(streaming=True)
+        )
+        return df.filter(pl.col("id").is_in(kept["id"]))
+    return remove_near_duplicates(df)
+
+
+def remove_duplicate_questions_and_responses(
+    df: pl.DataFrame | pl.LazyFrame,
+) -> pl.DataFrame | pl.LazyFrame:
     # remove duplicated reponse and questions
     df = df.unique(subset=["response"], keep="first")
     df = df.unique(subset=["question"], keep="first")
@@ -145,43 +363,77 @@ def stratify_dataframe(
     n_total: int,
     instruction_sources: list[str],
     seed: int,
+    strata: list[str] = config.stratification_keys,
 ) -> pl.DataFrame:
-    # Calculate the ideal number of samples from each source for a balanced dataset
-    samples_per_source = n_total // len(instruction_sources)
-
-    # Calculate counts of each source in the dataframe
-    source_counts = df["source"].value_counts()
-
-    # Identify sources with fewer samples than the ideal number
-    underrepresented_sources = source_counts.filter(
-        source_counts["count"] < samples_per_source
-    ).rows()
-
-    # Identify sources with enough or more samples than the ideal number
-    sufficiently_represented_sources = source_counts.filter(
-        source_counts["count"] >= samples_per_source
-    ).rows()
-
-    additional_samples_needed = 0
-    for source_count in underrepresented_sources:
-        additional_samples_needed += samples_per_source - source_count[1]
-
-    samples_per_source += additional_samples_needed // len(
-        sufficiently_represented_sources
+    """
+    Draws a stratified sample of exactly `n_total` rows (or all rows if fewer).
+
+    The strata are the combinations of the `strata` columns. Besides existing
+    columns, the derived keys "question_length_bucket", "question_token_bucket"
+    and "system_prompt_id" can be used. Rows are allocated to the strata by water-filling: every
+    stratum gets the same quota, strata with fewer rows give all of them, and
+    their shortfall is spread over the remaining strata. Within every stratum
+    the rows with the smallest seeded hash of their id are kept, so sampling is
+    vectorized and independent of row order.
+    """
+    df = df.filter(pl.col("source").is_in(instruction_sources))
+    derived_columns = [c for c in strata if c not in df.columns]
+    df = add_strata_columns(df, derived_columns)
+
+    # One group by pass for the size of every stratum
+    counts = df.group_by(strata).agg(pl.len().alias("count")).sort(strata)
+    counts = counts.with_columns(
+        pl.Series("quota", water_fill(counts["count"].to_numpy(), n_total))
     )
 
-    combined_samples = []
-
-    # Include all samples from underrepresented sources
-    for source in underrepresented_sources:
-        combined_samples.append(df.filter(df["source"] == source[0]))
+    stratified_df = (
+        df.join(counts.select(*strata, "quota"), on=strata)
+        .filter(pl.col("id").hash(seed).rank("ordinal").over(strata) <= pl.col("quota"))
+        .drop("quota", *derived_columns)
+    )
 
-    # Randomly sample from sufficiently represented sources
-    for source in sufficiently_represented_sources:
-        combined_samples.append(
-            df.filter(df["source"] == source[0]).sample(samples_per_source, seed=seed)
-        )
+    return stratified_df
 
-    stratified_df = pl.concat(combined_samples)
 
-    return stratified_df
+def water_fill(capacities: np.ndarray, n_total: int) -> np.ndarray:
+    """
+    Allocates `n_total` samples over groups as evenly as their capacities allow.
+
+    The allocation is min(capacity, level) for a common level, with the rows
+    left over by rounding given one each to the first groups above the level.
+    It sums to exactly min(n_total, sum(capacities)).
+    """
+    capacities = np.asarray(capacities, dtype=np.int64)
+    n_groups = len(capacities)
+    n_total = min(n_total, int(capacities.sum()))
+    if n_groups == 0:
+        return capacities
+
+    # Total allocated if the level were set to each sorted capacity
+    sorted_capacities = np.sort(capacities)
+    filled_below = np.concatenate([[0], np.cumsum(sorted_capacities)[:-1]])
+    totals = filled_below + sorted_capacities * (n_groups - np.arange(n_groups))
+    i = int(np.searchsorted(totals, n_total))
+    level, remainder = divmod(n_total - int(filled_below[i]), n_groups - i)
+
+    allocation = np.minimum(capacities, level)
+    above_level = np.flatnonzero(capacities > level)[:remainder]
+    allocation[above_level] += 1
+    return allocation
+
+
+def add_strata_columns(df: pl.DataFrame, columns: list[str]) -> pl.DataFrame:
+    """Adds the derived stratification keys in `columns` to `df`."""
+    expressions = {
+        "question_length_bucket": pl.col("question")
+        .str.len_chars()
+        .cut(config.question_length_buckets),
+        "question_token_bucket": token_count("question").cut(
+            config.question_token_buckets
+        ),
+        "system_prompt_id": pl.col("system_prompt").rank("dense"),
+    }
+    unknown_columns = [c for c in columns if c not in expressions]
+    if unknown_columns:
+        raise ValueError(f"Unknown stratification keys: {unknown_columns}")
+    return df.with_columns(expressions[c].alias(c) for c in columns)
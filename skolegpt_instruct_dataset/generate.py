@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import aiohttp
+import polars as pl
+from dotenv import load_dotenv
+from tqdm import tqdm
+
+from .async_translate import RETRY_STATUS_CODES, backoff_delay
+from .cache import CompletionCache
+from .checkpoint import ShardedCheckpoint
+from .config import config
+
+load_dotenv()
+
+
+class CompletionError(Exception):
+    """Raised by a completion backend when a request fails."""
+
+    def __init__(
+        self, status_code: int | None, message: str, retry_after: str | None = None
+    ):
+        super().__init__(f"Error: {status_code} - {message}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        # Connection errors have no status code and are worth retrying
+        return self.status_code is None or self.status_code in RETRY_STATUS_CODES
+
+
+class OpenAIChatBackend:
+    """
+    Completion backend for OpenAI compatible chat completion endpoints.
+
+    A backend is an async context manager with an async `complete` method that
+    sends one prompt and raises `CompletionError` on failure. Retries, limits
+    and caching are left to `generate_responses`, so any backend implementing
+    this interface can be plugged in.
+
+    Args:
+        url (str): Chat completions endpoint, e.g. a local stub server.
+        api_key (str | None): API key, defaults to the OPENAI_API_KEY variable.
+        concurrency (int): Size of the connection pool.
+    """
+
+    def __init__(
+        self,
+        url: str = config.completion_url,
+        api_key: str | None = None,
+        concurrency: int = config.completion_concurrency,
+    ):
+        self.url = url
+        self.api_key = (
+            api_key if api_key is not None else os.environ.get("OPENAI_API_KEY", "")
+        )
+        self.concurrency = concurrency
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            headers={"Authorization": f"Bearer {self.api_key}"},
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    async def complete(self, prompt: str, model: str, temperature: float) -> str:
+        data = {
+            "model": model,
+            "temperature": temperature,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        try:
+            async with self._session.post(self.url, json=data) as response:
+                if response.status == 200:
+                    body = await response.json()
+                    return body["choices"][0]["message"]["content"]
+                raise CompletionError(
+                    response.status,
+                    await response.text(),
+                    response.headers.get("Retry-After"),
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise CompletionError(None, repr(e))
+
+
+def completion_key(prompt: str, model: str, temperature: float) -> bytes:
+    """SHA-256 digest of the prompt, model and temperature of a completion."""
+    payload = json.dumps([prompt, model, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).digest()
+
+
+def load_survey_questions(
+    file_path: Path = config.data_dir / config.survey_questions_file_name,
+) -> pl.DataFrame:
+    """Loads the newline separated survey questions as instruction examples."""
+    with open(file_path, "r", encoding="utf-8") as file:
+        questions = [line.strip() for line in file]
+    return pl.DataFrame({"question": questions}).select(
+        ("skolegpt_survey." + pl.int_range(0, pl.len()).cast(pl.Utf8)).alias("id"),
+        pl.lit("").alias("system_prompt"),
+        "question",
+        pl.lit("skolegpt_survey").alias("source"),
+    )
+
+
+def generate_responses(
+    df: pl.DataFrame,
+    backend: OpenAIChatBackend | None = None,
+    model: str = config.completion_model,
+    temperature: float = config.completion_temperature,
+    concurrency: int = config.completion_concurrency,
+    max_retries: int = config.completion_max_retries,
+    save_freq: int = 100,
+    cache: CompletionCache | None = None,
+    checkpoint: ShardedCheckpoint | None = None,
+) -> pl.DataFrame:
+    """
+    Generates a response to the question of every row.
+
+    Up to `concurrency` completions run at a time, and failed requests are
+    retried with jittered exponential backoff when the error is transient.
+    Completions are cached by (model, prompt, temperature), and every
+    `save_freq` rows the successful ones are written as a checkpoint shard.
+    Rows whose completion still fails get a null response; they are not
+    checkpointed, so a resumed run retries them.
+
+    Args:
+        df (pl.DataFrame): Examples with "id" and "question" columns.
+        backend (OpenAIChatBackend | None): Completion backend, defaults to
+            the OpenAI chat completions API.
+        model (str): Model name.
+        temperature (float): Sampling temperature.
+        concurrency (int): Maximum number of completions in flight.
+        max_retries (int): Retries per completion on transient errors.
+        save_freq (int): Rows per checkpoint shard.
+        cache (CompletionCache | None): Persistent completion cache.
+        checkpoint (ShardedCheckpoint | None): Checkpoint to write and resume from.
+
+    Returns:
+        pl.DataFrame: `df` with an added "response" column.
+    """
+    backend = backend or OpenAIChatBackend(concurrency=concurrency)
+    stats = {"requests": 0, "retries": 0, "failures": 0, "cached": 0}
+    responses = asyncio.run(
+        _generate_responses(
+            df,
+            backend,
+            model,
+            temperature,
+            concurrency,
+            max_retries,
+            save_freq,
+            cache,
+            checkpoint,
+            stats,
+        )
+    )
+    print(f"Completions: {stats}")
+
+    if checkpoint is not None and checkpoint.shard_names:
+        responses = pl.concat(
+            [checkpoint.read().select("id", "response"), responses]
+        ).unique(subset="id", keep="first", maintain_order=True)
+    return df.join(responses, on="id", how="left")
+
+
+async def _generate_responses(
+    df: pl.DataFrame,
+    backend: OpenAIChatBackend,
+    model: str,
+    temperature: float,
+    concurrency: int,
+    max_retries: int,
+    save_freq: int,
+    cache: CompletionCache | None,
+    checkpoint: ShardedCheckpoint | None,
+    stats: dict,
+) -> pl.DataFrame:
+    """Returns the "id" and "response" of the rows not in the checkpoint."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def complete(prompt: str) -> str | None:
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                stats["requests"] += 1
+                try:
+                    return await backend.complete(prompt, model, temperature)
+                except CompletionError as e:
+                    if not e.retryable or attempt == max_retries:
+                        stats["failures"] += 1
+                        print(f"Completion failed: {e}")
+                        return None
+                    stats["retries"] += 1
+                    await asyncio.sleep(backoff_delay(attempt, e.retry_after))
+
+    remaining = checkpoint.remaining(df) if checkpoint is not None else df
+    chunks = [pl.DataFrame(schema={"id": pl.Utf8, "response": pl.Utf8})]
+    async with backend:
+        with tqdm(total=len(remaining)) as progress:
+            for chunk in remaining.iter_slices(save_freq):
+                prompts = chunk["question"].to_list()
+                keys = [completion_key(p, model, temperature) for p in prompts]
+                cached = cache.get_many(keys) if cache is not None else {}
+                stats["cached"] += sum(key in cached for key in keys)
+
+                # Identical prompts in a chunk share one completion
+                prompt_of_key = dict(zip(keys, prompts))
+                missing = [key for key in prompt_of_key if key not in cached]
+                generated = await asyncio.gather(
+                    *(complete(prompt_of_key[key]) for key in missing)
+                )
+                new = {key: r for key, r in zip(missing, generated) if r is not None}
+                if cache is not None:
+                    cache.put_many(new)
+
+                results = {**cached, **new}
+                chunk = chunk.select("id").with_columns(
+                    pl.Series("response", [results.get(k) for k in keys], pl.Utf8)
+                )
+                completed = chunk.drop_nulls("response")
+                if checkpoint is not None and len(completed):
+                    checkpoint.write_shard(completed)
+                chunks.append(chunk)
+                progress.update(len(chunk))
+
+    return pl.concat(chunks)
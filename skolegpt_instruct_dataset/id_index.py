@@ -0,0 +1,189 @@
+from pathlib import Path
+
+import datasets
+import numpy as np
+import polars as pl
+import pyarrow as pa
+import typer
+
+from .config import config
+
+_FNV_OFFSET_BASIS = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+
+
+def hash_ids(ids: pl.Series) -> np.ndarray:
+    """
+    Stable 64 bit FNV-1a hashes of string ids.
+
+    The hash is computed with numpy over the Arrow string buffers, one byte
+    position at a time for all ids at once, and does not depend on the Polars
+    version, so hashes persisted on disk stay valid.
+    """
+    array = ids.cast(pl.Utf8).to_arrow().cast(pa.large_string())
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    _, offsets_buffer, data_buffer = array.buffers()
+    offsets = np.frombuffer(offsets_buffer, dtype=np.int64)[
+        array.offset : array.offset + len(array) + 1
+    ]
+    data = (
+        np.frombuffer(data_buffer, dtype=np.uint8)
+        if data_buffer is not None
+        else np.empty(0, dtype=np.uint8)
+    )
+
+    starts = offsets[:-1]
+    lengths = offsets[1:] - starts
+    hashes = np.full(len(starts), _FNV_OFFSET_BASIS, dtype=np.uint64)
+    last_byte = max(len(data) - 1, 0)
+    with np.errstate(over="ignore"):
+        for position in range(int(lengths.max(initial=0))):
+            byte = data[np.minimum(starts + position, last_byte)].astype(np.uint64)
+            hashes = np.where(lengths > position, (hashes ^ byte) * _FNV_PRIME, hashes)
+    return hashes
+
+
+class TranslatedIdIndex:
+    """
+    Local index of the ids of already translated examples.
+
+    The index is a sorted array of 64 bit id hashes, memory-mapped from
+    `<name>.npy`, next to the exact ids in `<name>.parquet`. Membership is a
+    binary search over the hashes; with `exact=True`, hash hits are verified
+    against the exact ids, so a hash collision never drops a row.
+
+    `add` only writes the new ids, as a sorted delta `<name>_delta_<n>.npy` and
+    `<name>_delta_<n>.parquet`, so a merge costs the size of the new ids. The
+    deltas are merged into the base once there are `max_deltas` of them.
+
+    Args:
+        path (Path): Path of the index without suffix.
+        max_deltas (int): Number of delta files that triggers a merge.
+    """
+
+    def __init__(
+        self,
+        path: Path = config.data_dir / config.translated_id_index_name,
+        max_deltas: int = config.translated_id_index_max_deltas,
+    ):
+        self.path = Path(path)
+        self.hashes_path = self.path.with_suffix(".npy")
+        self.ids_path = self.path.with_suffix(".parquet")
+        self.max_deltas = max_deltas
+
+    def delta_paths(self) -> list[tuple[Path, Path]]:
+        """The hashes and ids files of every delta, oldest first."""
+        hashes_paths = sorted(self.path.parent.glob(f"{self.path.name}_delta_*.npy"))
+        return [(path, path.with_suffix(".parquet")) for path in hashes_paths]
+
+    def parts(self) -> list[tuple[Path, Path]]:
+        """The hashes and ids files of the base and of every delta."""
+        base = [(self.hashes_path, self.ids_path)] if self._base_exists() else []
+        return base + self.delta_paths()
+
+    def _base_exists(self) -> bool:
+        return self.hashes_path.is_file() and self.ids_path.is_file()
+
+    def exists(self) -> bool:
+        return bool(self.parts())
+
+    def __len__(self) -> int:
+        return sum(
+            len(np.load(hashes_path, mmap_mode="r")) for hashes_path, _ in self.parts()
+        )
+
+    def contains(self, ids: pl.Series, exact: bool = True) -> pl.Series:
+        """
+        Returns a boolean Series telling which ids are in the index, none if
+        the index does not exist.
+        """
+        hashes = hash_ids(ids)
+        found = np.zeros(len(hashes), dtype=bool)
+        for hashes_path, ids_path in self.parts():
+            part_hashes = np.load(hashes_path, mmap_mode="r")
+            if not len(part_hashes):
+                continue
+            positions = np.searchsorted(part_hashes, hashes)
+            positions = np.minimum(positions, len(part_hashes) - 1)
+            hits = ~found & (part_hashes[positions] == hashes)
+
+            if exact and hits.any():
+                candidates = ids.filter(pl.Series(hits))
+                exact_ids = pl.read_parquet(ids_path)["id"]
+                hits[hits] = candidates.is_in(exact_ids).to_numpy()
+            found |= hits
+
+        return pl.Series(ids.name, found)
+
+    def add(self, ids: pl.Series):
+        """Writes the ids not yet in the index as a new delta."""
+        ids = ids.cast(pl.Utf8).rename("id").drop_nulls().unique()
+        ids = ids.filter(~self.contains(ids))
+        if ids.is_empty():
+            return
+
+        deltas = self.delta_paths()
+        n = int(deltas[-1][0].stem.rsplit("_", 1)[1]) + 1 if deltas else 0
+        delta = self.path.with_name(f"{self.path.name}_delta_{n:06d}")
+        self._write(
+            delta.with_suffix(".npy"),
+            delta.with_suffix(".parquet"),
+            np.sort(hash_ids(ids)),
+            ids.sort(),
+        )
+
+        if len(deltas) + 1 >= self.max_deltas:
+            self.compact()
+
+    def compact(self):
+        """Merges the deltas into the base and deletes them."""
+        deltas = self.delta_paths()
+        if not deltas:
+            return
+        parts = self.parts()
+        index_hashes = np.unique(
+            np.concatenate([np.load(hashes_path) for hashes_path, _ in parts])
+        )
+        exact_ids = (
+            pl.concat(pl.read_parquet(ids_path)["id"] for _, ids_path in parts)
+            .unique()
+            .sort()
+        )
+        self._write(self.hashes_path, self.ids_path, index_hashes, exact_ids)
+        for paths in deltas:
+            for path in paths:
+                path.unlink()
+
+    def remove(self):
+        """Deletes the base and every delta."""
+        for paths in self.parts():
+            for path in paths:
+                path.unlink(missing_ok=True)
+
+    def _write(
+        self, hashes_path: Path, ids_path: Path, hashes: np.ndarray, ids: pl.Series
+    ):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Write the ids before the hashes, a part only counts once its hashes
+        # exist, and write next to the old files and swap, so readers never see
+        # half a part
+        tmp_hashes_path = hashes_path.with_name(hashes_path.name + ".tmp")
+        tmp_ids_path = ids_path.with_name(ids_path.name + ".tmp")
+        ids.to_frame().write_parquet(tmp_ids_path)
+        tmp_ids_path.replace(ids_path)
+        with open(tmp_hashes_path, "wb") as file:
+            np.save(file, hashes)
+        tmp_hashes_path.replace(hashes_path)
+
+
+def build_from_hub(repo_id: str = "kobprof/skolegpt-instruct"):
+    """Adds the ids of a translated dataset on the Hugging Face hub to the index."""
+    ds = datasets.load_dataset(repo_id)
+    index = TranslatedIdIndex()
+    index.add(pl.Series("id", ds["train"]["id"]))
+    print(f"Translated id index at {index.path} holds {len(index)} ids.")
+
+
+if __name__ == "__main__":
+    typer.run(build_from_hub)
@@ -0,0 +1,187 @@
+import os
+import shutil
+from pathlib import Path
+
+import datasets
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+from huggingface_hub import HfApi
+
+from .config import config
+from .id_index import TranslatedIdIndex
+
+
+class MasterDataset:
+    """
+    Local append-only copy of the master dataset as Parquet shards.
+
+    New examples are written as a new shard, the existing shards are never
+    rewritten or converted. Ids are deduplicated against an index of id hashes
+    next to the shards, and the dataset is shuffled through an index
+    permutation when it is loaded, so the rows on disk stay in place. The hub
+    revision the copy is based on is stored next to the shards, so a copy the
+    hub has moved past is refreshed before merging and never pushed.
+
+    Args:
+        directory (Path): Directory holding the shards and the id index.
+        repo_id (str): Hugging Face hub dataset to start from.
+    """
+
+    def __init__(
+        self,
+        directory: Path = config.data_dir / config.master_dataset_dir_name,
+        repo_id: str = config.master_dataset_repo_id,
+    ):
+        self.directory = Path(directory)
+        self.repo_id = repo_id
+        self.index = TranslatedIdIndex(self.directory / "ids")
+
+    @property
+    def shard_paths(self) -> list[Path]:
+        return sorted(self.directory.glob("shard_*.parquet"))
+
+    def exists(self) -> bool:
+        return bool(self.shard_paths)
+
+    def __len__(self) -> int:
+        return sum(pq.ParquetFile(p).metadata.num_rows for p in self.shard_paths)
+
+    @property
+    def schema(self) -> pa.Schema:
+        return pq.read_schema(self.shard_paths[0])
+
+    @property
+    def hub_revision(self) -> str | None:
+        """Commit sha of the hub dataset the local copy is based on."""
+        path = self._hub_revision_path
+        return path.read_text().strip() if path.is_file() else None
+
+    def remote_revision(self) -> str:
+        """Commit sha of the current hub dataset."""
+        return HfApi().dataset_info(self.repo_id).sha
+
+    def is_behind_hub(self) -> bool:
+        return self.hub_revision != self.remote_revision()
+
+    def download(self):
+        """Stores the hub dataset as the first shard, without converting it."""
+        revision = self.remote_revision()
+        ds = datasets.load_dataset(self.repo_id, revision=revision)
+        self._write_shard(ds["train"].data.table)
+        self._hub_revision_path.write_text(revision)
+
+    def refresh(self):
+        """
+        Downloads the current hub dataset again and re-appends the local shards.
+
+        The new copy is built next to the old one and swapped in when complete.
+        Local examples that reached the hub in the meantime are skipped by id.
+        """
+        new = MasterDataset(
+            self.directory.with_name(self.directory.name + ".refresh"), self.repo_id
+        )
+        shutil.rmtree(new.directory, ignore_errors=True)
+        new.download()
+        for shard_path in self.shard_paths[1:]:
+            new.append(pl.read_parquet(shard_path))
+
+        old_directory = self.directory.with_name(self.directory.name + ".old")
+        shutil.rmtree(old_directory, ignore_errors=True)
+        if self.directory.exists():
+            os.replace(self.directory, old_directory)
+        os.replace(new.directory, self.directory)
+        shutil.rmtree(old_directory, ignore_errors=True)
+
+    def push_to_hub(self, seed: int | None = config.seed):
+        """
+        Pushes the shuffled dataset to the hub, see `to_dataset`.
+
+        Raises:
+            RuntimeError: If the hub dataset changed since the local copy was
+                downloaded, as pushing would drop the new remote rows.
+        """
+        if self.is_behind_hub():
+            raise RuntimeError(
+                f"The hub dataset {self.repo_id} changed since the local copy in "
+                f"{self.directory} was downloaded. Refresh it first with "
+                "`MasterDataset.refresh`."
+            )
+        commit = self.to_dataset(seed=seed).push_to_hub(self.repo_id)
+        self._hub_revision_path.write_text(commit.oid)
+
+    def append(self, df: pl.DataFrame) -> int:
+        """
+        Adds the examples whose id is not in the dataset yet as a new shard.
+
+        Returns:
+        int: Number of examples added.
+        """
+        if self.exists():
+            self._ensure_index()
+            schema = self.schema
+            df = df.select(schema.names)
+        else:
+            schema = None
+
+        df = df.unique(subset="id", keep="first", maintain_order=True)
+        if self.index.exists():
+            df = df.filter(~self.index.contains(df["id"]))
+        if df.is_empty():
+            return 0
+
+        table = df.to_arrow()
+        self._write_shard(table.cast(schema) if schema is not None else table)
+        return len(df)
+
+    def to_dataset(self, seed: int | None = config.seed) -> datasets.Dataset:
+        """
+        Loads the shards as one dataset, shuffled by an index permutation.
+
+        The shards are memory-mapped and concatenated without copying, and the
+        shuffle only adds an indices mapping on top. `seed=None` skips it.
+        """
+        table = pa.concat_tables(
+            pq.read_table(path, memory_map=True) for path in self.shard_paths
+        )
+        ds = datasets.Dataset(datasets.table.InMemoryTable(table))
+        if seed is not None:
+            ds = ds.shuffle(seed=seed, keep_in_memory=True)
+        return ds
+
+    def _write_shard(self, table: pa.Table):
+        # Write next to the shards and rename, so readers never see half a shard
+        self.directory.mkdir(parents=True, exist_ok=True)
+        n_shards = len(self.shard_paths)
+        shard_path = self.directory / f"shard_{n_shards:06d}.parquet"
+        tmp_path = shard_path.with_suffix(".tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, shard_path)
+
+        self.index.add(pl.from_arrow(table.column("id")).rename("id"))
+        self._indexed_shards_path.write_text(str(n_shards + 1))
+
+    @property
+    def _hub_revision_path(self) -> Path:
+        return self.directory / "hub_revision.txt"
+
+    @property
+    def _indexed_shards_path(self) -> Path:
+        return self.directory / "indexed_shards.txt"
+
+    def _ensure_index(self):
+        # The shards are the source of truth: rebuild the index if a crash left
+        # it behind the shards
+        path = self._indexed_shards_path
+        n_indexed = int(path.read_text()) if path.is_file() else 0
+        if self.index.exists() and n_indexed == len(self.shard_paths):
+            return
+
+        self.index.remove()
+        self.index.add(
+            pl.concat(
+                pl.read_parquet(shard_path, columns=["id"])["id"]
+                for shard_path in self.shard_paths
+            )
+        )
+        path.write_text(str(len(self.shard_paths)))
@@ -0,0 +1,59 @@
+import typer
+
+from .mock_deepl import MockRequestHandler, MockServer, serve_in_background
+
+
+class MockCompletionRequestHandler(MockRequestHandler):
+    error_payload = {"error": {"message": "Mock failure"}}
+
+    def success_payload(self, data: dict) -> dict:
+        prompt = data["messages"][-1]["content"]
+        with self.server._lock:
+            self.server.stats["texts"] += 1
+            self.server.stats["characters"] += len(prompt)
+        content = f"[{data['model']}] {prompt}"
+        return {
+            "model": data["model"],
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+        }
+
+
+class MockCompletionServer(MockServer):
+    """
+    Local stand-in for an OpenAI compatible chat completions endpoint, see
+    `MockServer`.
+
+    Completions are the prompts prefixed with "[<model>] ".
+    """
+
+    handler_class = MockCompletionRequestHandler
+    path = "/v1/chat/completions"
+
+
+def run_mock_completion_server(**kwargs):
+    """Runs a `MockCompletionServer` in a background thread for the block."""
+    return serve_in_background(MockCompletionServer(**kwargs))
+
+
+def main(
+    port: int = 8766,
+    latency: float = 0.0,
+    max_requests_per_second: float = None,
+):
+    server = MockCompletionServer(
+        port=port,
+        latency=latency,
+        max_requests_per_second=max_requests_per_second,
+    )
+    print(f"Mock completion server listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,186 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import typer
+
+
+class MockRequestHandler(ABC, BaseHTTPRequestHandler):
+    """
+    Base request handler of the mock servers.
+
+    Reads the JSON request, applies the latency, scripted failures and rate
+    limit of the server, and answers with `success_payload` or
+    `error_payload` as JSON.
+    """
+
+    # HTTP/1.1 keeps connections alive between requests
+    protocol_version = "HTTP/1.1"
+    error_payload = {"message": "Mock failure"}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        data = json.loads(body)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        status = self.server.next_status()
+        payload = self.success_payload(data) if status == 200 else self.error_payload
+        self._respond(status, json.dumps(payload))
+
+    @abstractmethod
+    def success_payload(self, data: dict) -> dict:
+        """Response to a successful request with the JSON body `data`."""
+
+    def _respond(self, status: int, body: str):
+        encoded = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        if status == 429 and self.server.max_requests_per_second:
+            self.send_header(
+                "Retry-After", f"{1 / self.server.max_requests_per_second}"
+            )
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    Base of the local stand-ins for the APIs, served by `handler_class` at `path`.
+
+    Failures can be scripted to exercise the retry logic of the clients
+    offline.
+
+    Args:
+        port (int): Port to listen on, 0 picks a free port.
+        latency (float): Seconds to sleep before answering each request.
+        fail_statuses (list[int]): Status codes returned, in order, for the first
+            requests before the server starts answering successfully.
+        max_requests_per_second (float | None): Answer 429 with a Retry-After
+            header when requests arrive faster than this, allowing bursts of
+            up to one second worth of requests.
+    """
+
+    daemon_threads = True
+    handler_class: type[MockRequestHandler]
+    path: str
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        fail_statuses: list[int] | None = None,
+        max_requests_per_second: float | None = None,
+    ):
+        super().__init__(("127.0.0.1", port), self.handler_class)
+        self.latency = latency
+        self.fail_statuses = list(fail_statuses or [])
+        self.max_requests_per_second = max_requests_per_second
+        self.stats = {"requests": 0, "rejected": 0, "texts": 0, "characters": 0}
+        self._lock = threading.Lock()
+        self._tokens = max_requests_per_second or 0.0
+        self._updated_at = time.monotonic()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def next_status(self) -> int:
+        """Returns the status code for the next request and updates the stats."""
+        with self._lock:
+            self.stats["requests"] += 1
+            too_fast = False
+            if self.max_requests_per_second is not None:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.max_requests_per_second,
+                    self._tokens
+                    + (now - self._updated_at) * self.max_requests_per_second,
+                )
+                self._updated_at = now
+                too_fast = self._tokens < 1
+                if not too_fast:
+                    self._tokens -= 1
+
+            if self.fail_statuses:
+                status = self.fail_statuses.pop(0)
+            elif too_fast:
+                status = 429
+            else:
+                status = 200
+            if status != 200:
+                self.stats["rejected"] += 1
+            return status
+
+
+class MockDeepLRequestHandler(MockRequestHandler):
+    def success_payload(self, data: dict) -> dict:
+        texts = data["text"]
+        if isinstance(texts, str):
+            texts = [texts]
+        target_lang = data["target_lang"]
+        with self.server._lock:
+            self.server.stats["texts"] += len(texts)
+            self.server.stats["characters"] += sum(len(t) for t in texts)
+        return {
+            "translations": [
+                {"detected_source_language": "EN", "text": f"[{target_lang}] {t}"}
+                for t in texts
+            ]
+        }
+
+
+class MockDeepLServer(MockServer):
+    """
+    Local stand-in for the DeepL translate endpoint, see `MockServer`.
+
+    Translations are the input texts prefixed with "[<target_lang>] ", so results
+    can be mapped back to their inputs.
+    """
+
+    handler_class = MockDeepLRequestHandler
+    path = "/v2/translate"
+
+
+def run_mock_deepl_server(**kwargs):
+    """Runs a `MockDeepLServer` in a background thread for the duration of the block."""
+    return serve_in_background(MockDeepLServer(**kwargs))
+
+
+@contextmanager
+def serve_in_background(server: ThreadingHTTPServer):
+    """Runs a server in a background thread for the duration of the block."""
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(
+    port: int = 8765,
+    latency: float = 0.0,
+    max_requests_per_second: float = None,
+):
+    server = MockDeepLServer(
+        port=port,
+        latency=latency,
+        max_requests_per_second=max_requests_per_second,
+    )
+    print(f"Mock DeepL server listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    typer.run(main)
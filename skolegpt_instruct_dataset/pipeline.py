@@ -0,0 +1,162 @@
+import hashlib
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from .config import config
+
+package_dir = Path(__file__).parent
+
+
+@dataclass
+class Stage:
+    """
+    A pipeline step with the artifacts and settings that determine its output.
+
+    Args:
+        name (str): Name of the stage.
+        run (Callable): Runs the stage.
+        inputs (list[Path]): Artifacts read by the stage.
+        outputs (list[Path]): Artifacts written by the stage.
+        config_fields (list[str]): `Config` fields used by the stage.
+        code (list[Path]): Source files determining the output of the stage,
+            typically its script and the package modules it uses. Settings are
+            tracked by `config_fields`, so config.py is not listed.
+    """
+
+    name: str
+    run: Callable[[], None]
+    inputs: list[Path] = field(default_factory=list)
+    outputs: list[Path] = field(default_factory=list)
+    config_fields: list[str] = field(default_factory=list)
+    code: list[Path] = field(default_factory=list)
+
+
+def fingerprint_path(output: Path) -> Path:
+    return output.with_name(output.name + ".fingerprint.json")
+
+
+def file_sha256(path: Path) -> str:
+    """
+    Content hash of a file.
+
+    Hashes recorded in the fingerprint of the stage that wrote the file are
+    reused while its size and modification time are unchanged.
+    """
+    stat = path.stat()
+    record_path = fingerprint_path(path)
+    if record_path.is_file():
+        record = json.loads(record_path.read_text())
+        output = record.get("outputs", {}).get(path.name)
+        if output and (output["size"], output["mtime_ns"]) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            return output["sha256"]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def stage_fingerprint(stage: Stage) -> str:
+    """Hash of the stage inputs, its config values and the code version."""
+    code = sorted(set(stage.code))
+    payload = {
+        "inputs": {
+            str(path): file_sha256(path) if path.is_file() else None
+            for path in stage.inputs
+        },
+        "config": {name: getattr(config, name) for name in stage.config_fields},
+        "code": {path.name: file_sha256(path) for path in code},
+    }
+    serialized = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def is_up_to_date(stage: Stage, fingerprint: str) -> bool:
+    """
+    True if every output exists, was written with the same fingerprint and
+    still has the size and modification time recorded when it was written, so
+    deleted or edited outputs are rebuilt.
+    """
+    for output in stage.outputs:
+        record_path = fingerprint_path(output)
+        if not output.is_file() or not record_path.is_file():
+            return False
+        record = json.loads(record_path.read_text())
+        if record["fingerprint"] != fingerprint:
+            return False
+        recorded = record["outputs"].get(output.name)
+        stat = output.stat()
+        if recorded is None or (recorded["size"], recorded["mtime_ns"]) != (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            return False
+    return True
+
+
+def write_fingerprint(stage: Stage, fingerprint: str):
+    for output in stage.outputs:
+        stat = output.stat()
+        record = {
+            "stage": stage.name,
+            "fingerprint": fingerprint,
+            "outputs": {
+                output.name: {
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "sha256": file_sha256(output),
+                }
+            },
+        }
+        fingerprint_path(output).write_text(json.dumps(record, indent=2))
+
+
+def run_stage(stage: Stage, force: bool = False) -> bool:
+    """Runs a stage unless its outputs match its fingerprint. Returns True if run."""
+    fingerprint = stage_fingerprint(stage)
+    if not force and is_up_to_date(stage, fingerprint):
+        print(f"Skipping stage '{stage.name}', inputs and settings are unchanged.")
+        return False
+
+    print(f"Running stage '{stage.name}'.")
+    stage.run()
+    write_fingerprint(stage, fingerprint)
+    return True
+
+
+def run_pipeline(stages: list[Stage], force: bool = False, max_workers: int = 4):
+    """
+    Runs stages in dependency order, skipping the ones that are up to date.
+
+    A stage depends on the stages writing its inputs. Stages whose dependencies
+    have finished run concurrently.
+    """
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    dependencies = {
+        stage.name: {producers[path] for path in stage.inputs if path in producers}
+        for stage in stages
+    }
+    pending = {stage.name: stage for stage in stages}
+    done = set()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if dependencies[name] <= done:
+                    running[executor.submit(run_stage, stage, force)] = name
+                    del pending[name]
+            if not running:
+                raise ValueError(f"Unresolvable stage dependencies: {list(pending)}")
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                future.result()
+                done.add(running.pop(future))
@@ -0,0 +1,99 @@
+import cProfile
+import json
+import resource
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import polars as pl
+
+from .utils import print_elapsed_time
+
+
+def peak_rss_in_mb() -> float:
+    """Peak resident set size of the process so far (ru_maxrss is in KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StepProfiler:
+    """
+    Records wall time, CPU time, peak RSS growth and row counts of pipeline steps.
+
+    Every step is appended as one JSON line to `report_path`, if given. Steps
+    named in `profile_steps` additionally run under cProfile, with the stats
+    written to `<profile_dir>/<step>.prof` for e.g. `snakeviz` or `pstats`.
+
+    Args:
+        report_path (Path | None): NDJSON file to append the step records to.
+        profile_steps (list[str]): Names of the steps to run under cProfile.
+        profile_dir (Path | None): Directory for the cProfile stats, defaults to
+            the directory of `report_path`.
+        labels (dict | None): Extra fields added to every record, e.g. the
+            commit or dataset size of a benchmark run.
+    """
+
+    def __init__(
+        self,
+        report_path: Path | None = None,
+        profile_steps: list[str] | None = None,
+        profile_dir: Path | None = None,
+        labels: dict | None = None,
+    ):
+        self.report_path = Path(report_path) if report_path is not None else None
+        self.profile_steps = set(profile_steps or [])
+        if profile_dir is None and self.report_path is not None:
+            profile_dir = self.report_path.parent
+        self.profile_dir = Path(profile_dir) if profile_dir is not None else Path(".")
+        self.run_id = datetime.now().isoformat()[:19]
+        self.labels = labels or {}
+        self.records = []
+
+    def run(
+        self, step: str, func: Callable[[pl.DataFrame], pl.DataFrame], df: pl.DataFrame
+    ) -> pl.DataFrame:
+        """Runs `func(df)` as the step named `step` and records it."""
+        rows_in = len(df)
+        peak_rss_before = peak_rss_in_mb()
+        cpu_start_time = time.process_time()
+        start_time = time.time()
+
+        if step in self.profile_steps:
+            profile = cProfile.Profile()
+            df = profile.runcall(func, df)
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            profile.dump_stats(self.profile_dir / f"{step}.prof")
+        else:
+            df = func(df)
+
+        record = {
+            "run_id": self.run_id,
+            **self.labels,
+            "step": step,
+            "wall_time_s": round(time.time() - start_time, 4),
+            "cpu_time_s": round(time.process_time() - cpu_start_time, 4),
+            "peak_rss_delta_mb": round(peak_rss_in_mb() - peak_rss_before, 1),
+            "rows_in": rows_in,
+            "rows_out": len(df),
+        }
+        self.records.append(record)
+        if self.report_path is not None:
+            self.report_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.report_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+
+        print_elapsed_time(step, start_time)
+        return df
+
+    def table(self) -> str:
+        """Human-readable table of the recorded steps."""
+        columns = ["step", "wall_time_s", "cpu_time_s", "peak_rss_delta_mb"]
+        columns += ["rows_in", "rows_out"]
+        widths = {
+            c: max([len(c), *(len(str(r[c])) for r in self.records)]) for c in columns
+        }
+        lines = [" | ".join(c.ljust(widths[c]) for c in columns)]
+        lines.append("-+-".join("-" * widths[c] for c in columns))
+        for record in self.records:
+            lines.append(" | ".join(str(record[c]).ljust(widths[c]) for c in columns))
+        return "\n".join(lines)
@@ -0,0 +1,87 @@
+import re
+
+# Abbreviations followed by a period that does not end the sentence
+ABBREVIATIONS = [
+    "Mr",
+    "Mrs",
+    "Ms",
+    "Dr",
+    "Prof",
+    "Sr",
+    "Jr",
+    "St",
+    "Mt",
+    "Gen",
+    "Col",
+    "Lt",
+    "Sgt",
+    "Capt",
+    "Gov",
+    "Sen",
+    "Rep",
+    "Rev",
+    "vs",
+    "No",
+    "Fig",
+    "Vol",
+    "Inc",
+    "Ltd",
+    "Co",
+    "Corp",
+    "approx",
+    "Jan",
+    "Feb",
+    "Mar",
+    "Apr",
+    "Jun",
+    "Jul",
+    "Aug",
+    "Sep",
+    "Sept",
+    "Oct",
+    "Nov",
+    "Dec",
+]
+
+# Sentence boundaries: line breaks, and spaces after sentence punctuation when
+# the next sentence starts with a capital letter, a digit, a quote or bracket,
+# unless the period ends an abbreviation or a single letter initial, e.g. in
+# "Dr. Smith" or "U.S. Army"
+SEGMENT_BOUNDARY = re.compile(
+    r"(\s*\n\s*|(?<=[.!?])"
+    + "".join(rf"(?<!\b{abbreviation}\.)" for abbreviation in ABBREVIATIONS)
+    + r"(?<!\b[^\W\d_]\.)[ \t]+(?=[A-Z0-9\"'(\[]))"
+)
+
+# A letter, as opposed to digits, punctuation and underscores
+_LETTER = re.compile(r"[^\W\d_]")
+
+
+def split_segments(text: str) -> tuple[list[str], list[str]]:
+    """
+    Splits a text into sentence-like segments and the separators around them.
+
+    The text is `separators[0] + segments[0] + separators[1] + ... +
+    segments[-1] + separators[-1]`, so `join_segments` restores it exactly
+    from translated segments, keeping the original whitespace and line breaks.
+    """
+    stripped = text.strip()
+    if not stripped:
+        return [], [text]
+    leading = text[: len(text) - len(text.lstrip())]
+    trailing = text[len(text.rstrip()) :]
+
+    parts = SEGMENT_BOUNDARY.split(stripped)
+    return parts[0::2], [leading, *parts[1::2], trailing]
+
+
+def join_segments(segments: list[str], separators: list[str]) -> str:
+    parts = [separators[0]]
+    for segment, separator in zip(segments, separators[1:]):
+        parts += [segment, separator]
+    return "".join(parts)
+
+
+def needs_translation(segment: str) -> bool:
+    """False for segments without letters, e.g. numbers, which are kept as is."""
+    return _LETTER.search(segment) is not None
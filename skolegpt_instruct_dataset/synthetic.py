@@ -0,0 +1,217 @@
+import numpy as np
+import polars as pl
+
+from .config import config
+
+SOURCES = ["flan", "niv", "t0", "cot"]
+SOURCE_WEIGHTS = [0.55, 0.2, 0.2, 0.05]  # rough shares of the OpenOrca sources
+
+SYSTEM_PROMPTS = [
+    "",
+    "You are an AI assistant. You will be given a task. You must generate a detailed and long answer.",
+    "You are a helpful assistant, who always provide explanation. Think like you are answering to a five year old.",
+    "You are an AI assistant that helps people find information.",
+    "You are an AI assistant. User will you give you a task. Your goal is to complete the task as faithfully as you can. While performing the task think step-by-step and justify your steps.",
+    "You should describe the task and explain your answer. While answering a multiple choice question, first output the correct answer(s). Then explain why other answers are wrong. Think like you are answering to a five year old.",
+    "Explain how you used the definition to come up with the answer.",
+    "You are a teacher. Given a task, you explain in simple steps what the task is asking, any guidelines it provides and how to use those guidelines to find the answer.",
+    "You are an AI assistant. Provide a detailed answer so user don't need to search outside to understand the answer.",
+    "User will you give you a task with some instruction. Your job is follow the instructions as faithfully as you can. While answering think step-by-step and justify your answer.",
+    "Given a definition of a task and a sample input, break the definition into small parts. Each of those parts will have some instruction. Explain their meaning by showing an example that meets the criteria in the instruction.",
+    "You are an AI assistant that follows instruction extremely well. Help as much as you can.",
+    "You are a helpful assistant, who always provide explanation.",
+    "You are an AI assistant, who knows every language and how to translate one language to another.",
+    "You are an AI assistant that helps people find information. Provide a detailed answer so user don't need to search outside to understand the answer.",
+    "You are an AI assistant. You should describe the task and explain your answer.",
+]
+
+# Code point ranges of the scripts used for non-Latin sentences
+FOREIGN_SCRIPT_RANGES = [
+    (0x0430, 0x044F),  # Cyrillic
+    (0x03B1, 0x03C9),  # Greek
+    (0x0627, 0x064A),  # Arabic
+    (0x0905, 0x0939),  # Devanagari
+    (0x0E01, 0x0E2E),  # Thai
+    (0x3041, 0x3096),  # Hiragana
+    (0x4E00, 0x9FFF),  # CJK ideographs
+    (0xAC00, 0xD7A3),  # Hangul
+]
+
+_SYLLABLES = [c + v for c in "bcdfghjklmnprstvwz" for v in "aeiou"] + [
+    "th",
+    "st",
+    "er",
+    "an",
+    "in",
+    "on",
+]
+
+
+def generate_synthetic_data(
+    n_rows: int,
+    seed: int = config.seed,
+    foreign_script_share: float = 0.03,
+    duplicate_share: float = 0.02,
+    near_duplicate_share: float = 0.02,
+    chunk_size: int = 100_000,
+) -> pl.DataFrame:
+    """
+    Seeded synthetic examples with the schema of the sampled OpenOrca data.
+
+    Questions and responses are built from a pool of sentences of Zipf
+    distributed pseudo-words, with log-normal numbers of sentences per text.
+    Shares of the rows get the artifacts the filter steps look for: common
+    prefixes and postfixes, sometimes stacked, translation instructions,
+    multiple choice options, trailing colons, empty responses, sentences in
+    non-Latin scripts, exact duplicates and near-duplicates. The same
+    arguments always give the same frame.
+
+    Args:
+        n_rows (int): Number of rows.
+        seed (int): Random seed.
+        foreign_script_share (float): Share of sentences in non-Latin scripts.
+        duplicate_share (float): Share of rows copying another row.
+        near_duplicate_share (float): Share of rows copying the question of
+            another row with a changed number appended.
+        chunk_size (int): Rows generated at a time, bounds the memory of the
+            intermediate frames.
+
+    Returns:
+        pl.DataFrame: Columns "id", "system_prompt", "question", "response" and
+            "source".
+    """
+    rng = np.random.default_rng(seed)
+    sentences = _sentence_pool(rng, foreign_script_share)
+
+    chunks = []
+    for offset in range(0, n_rows, chunk_size):
+        n_chunk = min(chunk_size, n_rows - offset)
+        chunks.append(_generate_chunk(rng, sentences, offset, n_chunk))
+    if not chunks:
+        return _generate_chunk(rng, sentences, 0, 0)
+    df = pl.concat(chunks)
+
+    return _add_duplicates(rng, df, duplicate_share, near_duplicate_share)
+
+
+def _sentence_pool(
+    rng: np.random.Generator, foreign_script_share: float, n_sentences: int = 20_000
+) -> pl.Series:
+    vocabulary = [
+        "".join(rng.choice(_SYLLABLES, size=rng.integers(1, 4))) for _ in range(5_000)
+    ]
+    sentences = []
+    for _ in range(n_sentences):
+        n_words = 3 + rng.poisson(9)
+        if rng.random() < foreign_script_share:
+            low, high = FOREIGN_SCRIPT_RANGES[rng.integers(len(FOREIGN_SCRIPT_RANGES))]
+            words = [
+                "".join(map(chr, rng.integers(low, high + 1, size=rng.integers(2, 7))))
+                for _ in range(n_words)
+            ]
+        else:
+            ranks = np.minimum(rng.zipf(1.3, size=n_words), len(vocabulary)) - 1
+            words = [vocabulary[rank] for rank in ranks]
+            words[0] = words[0].capitalize()
+        sentences.append(" ".join(words) + rng.choice([".", ".", ".", "?", "!"]))
+    return pl.Series("sentence", sentences)
+
+
+def _texts(
+    rng: np.random.Generator,
+    sentences: pl.Series,
+    n_rows: int,
+    mean: float,
+    sigma: float,
+    max_sentences: int,
+) -> pl.Series:
+    counts = np.clip(
+        np.ceil(rng.lognormal(mean, sigma, size=n_rows)), 1, max_sentences
+    ).astype(np.int64)
+    indices = rng.integers(len(sentences), size=counts.sum())
+    return (
+        pl.DataFrame(
+            {
+                "row": np.repeat(np.arange(n_rows), counts),
+                "sentence": sentences.gather(indices),
+            }
+        )
+        .group_by("row", maintain_order=True)
+        .agg(pl.col("sentence"))
+        .get_column("sentence")
+        .list.join(" ")
+    )
+
+
+def _generate_chunk(
+    rng: np.random.Generator, sentences: pl.Series, offset: int, n_rows: int
+) -> pl.DataFrame:
+    sources = pl.Series(SOURCES).gather(
+        rng.choice(len(SOURCES), size=n_rows, p=SOURCE_WEIGHTS)
+    )
+    df = pl.DataFrame(
+        {
+            "id": sources
+            + "."
+            + pl.Series(np.arange(offset, offset + n_rows)).cast(pl.Utf8),
+            "system_prompt": pl.Series(SYSTEM_PROMPTS).gather(
+                rng.integers(len(SYSTEM_PROMPTS), size=n_rows)
+            ),
+            "question": _texts(rng, sentences, n_rows, 1.5, 1.0, 60),
+            "response": _texts(rng, sentences, n_rows, 1.5, 1.1, 100),
+            "source": sources,
+        }
+    )
+
+    def pick(share: float) -> pl.Series:
+        return pl.Series(rng.random(n_rows) < share)
+
+    def choose(values: list[str]) -> pl.Series:
+        return pl.Series(values).gather(rng.integers(len(values), size=n_rows))
+
+    question = pl.col("question")
+    return df.with_columns(
+        question=pl.when(pick(0.3))
+        .then(choose(config.common_prefixes) + " " + question)
+        .otherwise(question),
+    ).with_columns(
+        question=pl.when(pick(0.05))
+        .then(choose(config.common_prefixes) + " " + question)
+        .when(pick(0.01))
+        .then("Translate the following sentence to German: " + question)
+        .when(pick(0.05))
+        .then(question + " Options: A) yes B) no C) it is not possible to tell")
+        .when(pick(0.1))
+        .then(question + " " + choose(config.common_postfixes))
+        .when(pick(0.02))
+        .then(question + ":")
+        .otherwise(question),
+        response=pl.when(pick(0.005)).then(pl.lit(" ")).otherwise(pl.col("response")),
+    )
+
+
+def _add_duplicates(
+    rng: np.random.Generator,
+    df: pl.DataFrame,
+    duplicate_share: float,
+    near_duplicate_share: float,
+) -> pl.DataFrame:
+    n_rows = len(df)
+    originals = pl.Series(rng.integers(max(n_rows, 1), size=n_rows))
+    kind = rng.random(n_rows)
+    is_duplicate = pl.Series(kind < duplicate_share)
+    is_near_duplicate = pl.Series(
+        (kind >= duplicate_share) & (kind < duplicate_share + near_duplicate_share)
+    )
+    numbers = pl.Series(rng.integers(1000, size=n_rows)).cast(pl.Utf8)
+
+    return df.with_columns(
+        question=pl.when(is_duplicate)
+        .then(pl.col("question").gather(originals))
+        .when(is_near_duplicate)
+        .then(pl.col("question").gather(originals) + " " + numbers)
+        .otherwise(pl.col("question")),
+        response=pl.when(is_duplicate)
+        .then(pl.col("response").gather(originals))
+        .otherwise(pl.col("response")),
+    )
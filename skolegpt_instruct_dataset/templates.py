@@ -0,0 +1,125 @@
+import polars as pl
+
+from .config import config
+
+# Leading scaffold: the first line up to a colon followed by more text on the
+# same line, e.g. "Generate a question about the following movie plot:", or
+# else the whole first line when more lines follow
+_COLON_HEAD = r"^([^\n]*?:)[ \t]+\S"
+_LINE_HEAD = r"^([^\n]*)\n\s*\S"
+
+# Trailing scaffold: the last line, e.g. "Answer:"
+_TAIL = r"\S\s*\n\s*([^\n]+)$"
+
+
+def _heads(questions: pl.Expr) -> pl.Expr:
+    return pl.coalesce(
+        questions.str.extract(_COLON_HEAD, 1), questions.str.extract(_LINE_HEAD, 1)
+    )
+
+
+def mine_templates(
+    questions: pl.Series,
+    min_count: int = config.template_min_count,
+    min_chars: int = config.template_min_chars,
+) -> pl.DataFrame:
+    """
+    Finds the instruction scaffolds that many questions share.
+
+    Many questions, e.g. the FLAN and NIV task instructions, are a fixed
+    leading or trailing line around a variable slot. The candidate head and
+    tail of every question are extracted with one regex each, and the ones
+    occurring at least `min_count` times are kept.
+
+    Args:
+        questions (pl.Series): The questions to mine.
+        min_count (int): Minimum number of questions sharing a scaffold.
+        min_chars (int): Minimum length of a scaffold.
+
+    Returns:
+        pl.DataFrame: Columns "kind" ("head" or "tail"), "scaffold" and "count",
+            most frequent first.
+    """
+    frames = []
+    for kind, candidates in [
+        ("head", _heads(pl.col("question"))),
+        ("tail", pl.col("question").str.extract(_TAIL, 1)),
+    ]:
+        frames.append(
+            pl.DataFrame({"question": questions})
+            .select(candidates.alias("scaffold"))
+            .drop_nulls()
+            .group_by("scaffold")
+            .agg(pl.len().cast(pl.Int64).alias("count"))
+            .filter(
+                (pl.col("count") >= min_count)
+                & (pl.col("scaffold").str.len_chars() >= min_chars)
+            )
+            .select(pl.lit(kind).alias("kind"), "scaffold", "count")
+        )
+    return pl.concat(frames).sort(["count", "scaffold"], descending=[True, False])
+
+
+def split_templates(questions: pl.Series, templates: pl.DataFrame) -> pl.DataFrame:
+    """
+    Splits questions into a known head and tail scaffold and the slot between.
+
+    Returns:
+        pl.DataFrame: Columns "head", "head_sep", "slot", "tail_sep" and "tail",
+            which concatenate to the question. Questions without a known
+            scaffold have empty heads and tails, and the whole text as slot.
+    """
+    heads = templates.filter(pl.col("kind") == "head")["scaffold"]
+    tails = templates.filter(pl.col("kind") == "tail")["scaffold"]
+    question = pl.col("question")
+    head = pl.col("head")
+    rest = pl.col("rest")
+    tail = pl.col("tail")
+
+    return (
+        pl.DataFrame({"question": questions})
+        .with_columns(_heads(question).alias("head"))
+        .with_columns(
+            pl.when(head.is_in(heads)).then(head).otherwise(pl.lit("")).alias("head")
+        )
+        .with_columns(question.str.slice(head.str.len_chars()).alias("rest"))
+        .with_columns(rest.str.extract(r"^(\s*)", 1).alias("head_sep"))
+        .with_columns(rest.str.slice(pl.col("head_sep").str.len_chars()).alias("rest"))
+        .with_columns(rest.str.extract(_TAIL, 1).alias("tail"))
+        .with_columns(
+            pl.when(tail.is_in(tails)).then(tail).otherwise(pl.lit("")).alias("tail")
+        )
+        .with_columns(
+            rest.str.slice(0, rest.str.len_chars() - tail.str.len_chars()).alias("rest")
+        )
+        .with_columns(rest.str.extract(r"(\s*)$", 1).alias("tail_sep"))
+        .select(
+            "head",
+            "head_sep",
+            rest.str.slice(
+                0, rest.str.len_chars() - pl.col("tail_sep").str.len_chars()
+            ).alias("slot"),
+            "tail_sep",
+            "tail",
+        )
+    )
+
+
+def join_templates(parts: pl.DataFrame, scaffolds: dict[str, str]) -> pl.Series:
+    """
+    Joins the parts from `split_templates`, with the scaffolds looked up.
+
+    Args:
+        parts (pl.DataFrame): Output of `split_templates`, typically with
+            translated slots.
+        scaffolds (dict[str, str]): Translation of every scaffold.
+    """
+    return parts.select(
+        pl.concat_str(
+            pl.col("head").replace(scaffolds),
+            "head_sep",
+            "slot",
+            "tail_sep",
+            pl.col("tail").replace(scaffolds),
+        ).alias("question")
+    )["question"]
@@ -0,0 +1,78 @@
+from functools import partial
+
+import numpy as np
+import polars as pl
+import tiktoken
+
+from .config import config
+
+TOKEN_COLUMNS = {"question": "question_tokens", "response": "response_tokens"}
+
+
+def count_tokens(
+    texts: pl.Series,
+    encoding_name: str = config.tokenizer_encoding,
+    num_threads: int = config.token_count_threads,
+    chunk_size: int = config.token_count_chunk_size,
+) -> pl.Series:
+    """
+    Number of tokens of every text, null for null texts.
+
+    The texts are encoded `chunk_size` at a time with `encode_ordinary_batch`,
+    which spreads them over `num_threads` threads sharing the encoding, loaded
+    once per process, while tiktoken releases the GIL. Only the lengths are
+    kept, so memory is bounded by one chunk of tokens. Special tokens such as
+    "<|endoftext|>" in the texts are encoded as ordinary text.
+
+    Args:
+        texts (pl.Series): The texts.
+        encoding_name (str): tiktoken encoding, e.g. "cl100k_base".
+        num_threads (int): Threads encoding each chunk.
+        chunk_size (int): Texts per chunk.
+
+    Returns:
+        pl.Series: UInt32 token counts named like `texts`.
+    """
+    encoding = tiktoken.get_encoding(encoding_name)
+    lengths = np.empty(len(texts), dtype=np.uint32)
+    for offset in range(0, len(texts), chunk_size):
+        chunk = texts.slice(offset, chunk_size).fill_null("").to_list()
+        tokens = encoding.encode_ordinary_batch(chunk, num_threads=num_threads)
+        lengths[offset : offset + len(chunk)] = [len(t) for t in tokens]
+
+    counts = pl.Series(texts.name, lengths, dtype=pl.UInt32)
+    if texts.null_count():
+        counts = counts.scatter(texts.is_null().arg_true(), None)
+    return counts
+
+
+def token_count(column: str, encoding_name: str = config.tokenizer_encoding) -> pl.Expr:
+    """Expression counting the tokens of a text column, also in lazy frames."""
+    return pl.col(column).map_batches(
+        partial(count_tokens, encoding_name=encoding_name),
+        return_dtype=pl.UInt32,
+        is_elementwise=True,
+    )
+
+
+def add_token_counts(
+    df: pl.DataFrame | pl.LazyFrame,
+    encoding_name: str = config.tokenizer_encoding,
+) -> pl.DataFrame | pl.LazyFrame:
+    """Adds "question_tokens" and "response_tokens" columns."""
+    return df.with_columns(
+        token_count(column, encoding_name).alias(token_column)
+        for column, token_column in TOKEN_COLUMNS.items()
+    )
+
+
+def total_tokens(df: pl.DataFrame) -> int:
+    """Tokens of all questions and responses, counted unless already in `df`."""
+    if not set(TOKEN_COLUMNS.values()) <= set(df.columns):
+        df = add_token_counts(df.select(*TOKEN_COLUMNS))
+    return df.select(
+        pl.sum_horizontal(
+            pl.col(token_column).cast(pl.Int64).sum()
+            for token_column in TOKEN_COLUMNS.values()
+        )
+    ).item()
@@ -1,67 +1,381 @@
-import os
-from datetime import datetime
+import asyncio
+import difflib
+import json
 
 import polars as pl
-import requests
-from dotenv import load_dotenv
 from tqdm import tqdm
 
+from .async_translate import AsyncDeepLTranslator
+from .cache import TranslationCache, translation_key
+from .checkpoint import ShardedCheckpoint
 from .config import config
+from .segments import join_segments, needs_translation, split_segments
+from .templates import join_templates, split_templates
 
-load_dotenv()
 
-auth_key = os.environ["DEEPL_API_KEY"]
-
-
-def translate_dataset(df: pl.DataFrame, save_freq: int) -> pl.DataFrame:
+def translate_dataset(
+    df: pl.DataFrame,
+    save_freq: int,
+    translator: AsyncDeepLTranslator | None = None,
+    cache: TranslationCache | None = None,
+    checkpoint: ShardedCheckpoint | None = None,
+    segmented: bool = config.translate_segments,
+    templates: pl.DataFrame | None = None,
+    stats: dict | None = None,
+) -> pl.DataFrame:
     """Translation pipeline wiht DeepL."""
-    df = translate_system_prompts(df)
-    df = translate_examples(df, save_freq=save_freq)
+    translator = translator or AsyncDeepLTranslator()
+    df = translate_system_prompts(df, translator=translator, cache=cache)
+    df = translate_examples(
+        df,
+        save_freq=save_freq,
+        translator=translator,
+        cache=cache,
+        checkpoint=checkpoint,
+        segmented=segmented,
+        templates=templates,
+        stats=stats,
+    )
     return df
 
 
-def translate_with_deepl(text: str, target_lang: str):
+def batch_texts(
+    texts: list[str],
+    max_texts: int = config.deepl_max_texts_per_request,
+    max_bytes: int = config.deepl_max_request_bytes,
+) -> list[list[str]]:
     """
-    Translates text using the DeepL API.
+    Packs texts into consecutive batches that respect the DeepL request limits.
+
+    Batches keep the input order, so concatenating the translated batches maps
+    back onto the input one to one. A single text larger than `max_bytes` is
+    sent on its own and left to DeepL to accept or reject.
 
     Args:
-        text (str or list of str): The text to be translated.
-        target_lang (str): The target language code (e.g., "DE" for German).
-        auth_key (str): Your DeepL API authentication key.
+        texts (list of str): The texts to be batched.
+        max_texts (int): Maximum number of texts per request.
+        max_bytes (int): Maximum size of the JSON encoded texts per request.
 
     Returns:
-        str: The translated text or an error message.
+        list of list of str: The batches of texts.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for text in texts:
+        # Size of the text as it will appear in the JSON payload, incl. separator
+        text_bytes = len(json.dumps(text).encode("utf-8")) + 2
+        if batch and (len(batch) >= max_texts or batch_bytes + text_bytes > max_bytes):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(text)
+        batch_bytes += text_bytes
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def translate_batch_with_deepl(
+    texts: list[str],
+    target_lang: str,
+    translator: AsyncDeepLTranslator | None = None,
+    cache: TranslationCache | None = None,
+) -> list[str]:
+    """
+    Translates many texts with as few DeepL requests as the API limits allow.
+
+    The requests are sent concurrently through `translator`.
+
+    Args:
+        texts (list of str): The texts to be translated.
+        target_lang (str): The target language code (e.g., "DA" for Danish).
+        translator (AsyncDeepLTranslator): Client to send the requests with.
+        cache (TranslationCache | None): Cache to look translations up in first.
+
+    Returns:
+        list of str: The translated texts in the same order as `texts`.
+    """
+    translator = translator or AsyncDeepLTranslator()
+
+    async def run():
+        async with translator:
+            return await _translate_texts(texts, target_lang, translator, cache)
+
+    return asyncio.run(run())
+
+
+async def _translate_texts(
+    texts: list[str],
+    target_lang: str,
+    translator: AsyncDeepLTranslator,
+    cache: TranslationCache | None = None,
+    stats: dict | None = None,
+    refresh: bool = False,
+) -> list[str]:
     """
-    # URL for the DeepL API
-    url = "https://api.deepl.com/v2/translate"
+    Translates texts through the cache, sending only the misses to DeepL.
 
-    # Define the request headers
-    headers = {
-        "Authorization": f"DeepL-Auth-Key {auth_key}",
-        "Content-Type": "application/json",
-    }
+    Identical texts are only sent once, also when no cache is given. The number
+    of texts and characters sent are added to `stats`, if given. With
+    `refresh`, all texts are sent and their cached translations are replaced.
+    """
+    keys = [
+        translation_key(text, target_lang, translator.source_lang, translator.options)
+        for text in texts
+    ]
+    translations = cache.get_many(keys) if cache is not None and not refresh else {}
 
-    # Convert single string input to a list if needed
-    if isinstance(text, str):
-        text = [text]
+    missing_texts = {}
+    for key, text in zip(keys, texts):
+        if key not in translations:
+            missing_texts.setdefault(key, text)
 
-    # Define the data payload
-    data = {"text": text, "target_lang": target_lang}
+    if stats is not None:
+        stats["sent_texts"] = stats.get("sent_texts", 0) + len(missing_texts)
+        stats["billed_characters"] = stats.get("billed_characters", 0) + sum(
+            len(text) for text in missing_texts.values()
+        )
 
-    # Send the POST request
-    response = requests.post(url, headers=headers, json=data)
+    if missing_texts:
+        batches = batch_texts(list(missing_texts.values()))
+        translated_batches = await translator.translate_batches(
+            batches, target_lang, return_exceptions=True
+        )
+        missing_keys = list(missing_texts)
+        new_translations = {}
+        error = None
+        offset = 0
+        for batch, translated_batch in zip(batches, translated_batches):
+            if isinstance(translated_batch, BaseException):
+                error = error or translated_batch
+            else:
+                batch_keys = missing_keys[offset : offset + len(batch)]
+                new_translations.update(zip(batch_keys, translated_batch))
+            offset += len(batch)
 
-    # Check the response
-    if response.status_code == 200:
-        # Return the translated text
-        translated_text = response.json()["translations"][0]["text"]
-        return translated_text
-    else:
-        # Return an error message if the request was not successful
-        return f"Error: {response.status_code} - {response.text}"
+        # Cache the translated batches before raising, they are already billed
+        if cache is not None:
+            cache.put_many(new_translations)
+        if error is not None:
+            raise error
+        translations.update(new_translations)
 
+    return [translations[key] for key in keys]
 
-def translate_system_prompts(df: pl.DataFrame) -> pl.DataFrame:
+
+async def _translate_segmented(
+    texts: list[str],
+    target_lang: str,
+    translator: AsyncDeepLTranslator,
+    cache: TranslationCache | None = None,
+    stats: dict | None = None,
+) -> list[str]:
+    """
+    Translates texts sentence by sentence through the translation memory.
+
+    The texts are split into segments, and only the segments that are neither
+    in the cache nor repeated earlier in `texts` are sent to DeepL. Boilerplate
+    shared between responses, e.g. "Step 1:" lines, is thereby paid for once,
+    and an edited text only costs its changed sentences. Segments without
+    letters are kept as is. The translated segments are joined with the
+    original separators.
+    """
+    splits = [split_segments(text) for text in texts]
+    segments = [
+        segment
+        for segment_list, _ in splits
+        for segment in segment_list
+        if needs_translation(segment)
+    ]
+    if stats is not None:
+        stats["segments"] = stats.get("segments", 0) + len(segments)
+
+    translated = iter(
+        await _translate_texts(segments, target_lang, translator, cache, stats)
+    )
+    return [
+        join_segments(
+            [
+                next(translated) if needs_translation(segment) else segment
+                for segment in segment_list
+            ],
+            separators,
+        )
+        for segment_list, separators in splits
+    ]
+
+
+async def _translate_templated(
+    questions: list[str],
+    target_lang: str,
+    translator: AsyncDeepLTranslator,
+    cache: TranslationCache | None,
+    stats: dict | None,
+    templates: pl.DataFrame,
+    scaffolds: dict[str, str],
+    segmented: bool,
+) -> list[str]:
+    """
+    Translates only the slots of templated questions.
+
+    The questions are split into their scaffolds from `templates` and the slot
+    between them, the slots are translated, and the questions are joined with
+    the translated scaffolds in `scaffolds`. Questions without a known
+    scaffold are translated whole.
+    """
+    translate_texts = _translate_segmented if segmented else _translate_texts
+    parts = split_templates(pl.Series(questions, dtype=pl.Utf8), templates)
+    slots = await translate_texts(
+        parts["slot"].to_list(), target_lang, translator, cache, stats
+    )
+    return join_templates(
+        parts.with_columns(pl.Series("slot", slots, dtype=pl.Utf8)), scaffolds
+    ).to_list()
+
+
+async def _translate_scaffolds(
+    templates: pl.DataFrame,
+    target_lang: str,
+    translator: AsyncDeepLTranslator,
+    cache: TranslationCache | None,
+    stats: dict | None,
+) -> dict[str, str]:
+    scaffolds = templates["scaffold"].unique().to_list()
+    translated = await _translate_texts(
+        scaffolds, target_lang, translator, cache, stats
+    )
+    return dict(zip(scaffolds, translated))
+
+
+def validate_templates(
+    df: pl.DataFrame,
+    templates: pl.DataFrame,
+    n: int = 100,
+    translator: AsyncDeepLTranslator | None = None,
+    cache: TranslationCache | None = None,
+    segmented: bool = config.translate_segments,
+    seed: int = config.seed,
+) -> pl.DataFrame:
+    """
+    Compares templated translations of questions with full-text translations.
+
+    A sample of `n` questions with a known scaffold is translated both whole
+    and through `_translate_templated`, to check that translating scaffolds
+    and slots separately does not change the translations much.
+
+    Returns:
+        pl.DataFrame: Columns "id", "question", "full", "templated" and
+            "similarity", the `difflib` ratio of the two translations.
+    """
+    translator = translator or AsyncDeepLTranslator()
+    parts = split_templates(df["question"], templates)
+    templated_rows = df.filter((parts["head"] != "") | (parts["tail"] != ""))
+    sample = templated_rows.sample(min(n, len(templated_rows)), seed=seed)
+    questions = sample["question"].to_list()
+    full_stats, templated_stats = {}, {}
+
+    async def translate():
+        async with translator:
+            full = await _translate_texts(
+                questions, "DA", translator, cache, full_stats
+            )
+            scaffolds = await _translate_scaffolds(
+                templates, "DA", translator, cache, templated_stats
+            )
+            templated = await _translate_templated(
+                questions,
+                "DA",
+                translator,
+                cache,
+                templated_stats,
+                templates,
+                scaffolds,
+                segmented,
+            )
+        return full, templated
+
+    full, templated = asyncio.run(translate())
+    df_validation = sample.select("id", "question").with_columns(
+        pl.Series("full", full, dtype=pl.Utf8),
+        pl.Series("templated", templated, dtype=pl.Utf8),
+        pl.Series(
+            "similarity",
+            [
+                difflib.SequenceMatcher(None, a, b).ratio()
+                for a, b in zip(full, templated)
+            ],
+            dtype=pl.Float64,
+        ),
+    )
+    print(
+        f"Template validation on {len(df_validation)} questions: "
+        f"mean similarity {df_validation['similarity'].mean():.3f}, "
+        f"{(df_validation['full'] == df_validation['templated']).mean():.1%} identical. "
+        f"Billed characters: {full_stats.get('billed_characters', 0)} full, "
+        f"{templated_stats.get('billed_characters', 0)} templated "
+        "(including the scaffolds)."
+    )
+    return df_validation
+
+
+def retranslate_rows(
+    df_translated: pl.DataFrame,
+    df_source: pl.DataFrame,
+    ids: pl.Series,
+    translator: AsyncDeepLTranslator | None = None,
+    cache: TranslationCache | None = None,
+    stats: dict | None = None,
+) -> pl.DataFrame:
+    """
+    Translates the rows with the given ids again and merges them back by id.
+
+    The questions and responses are sent whole, bypassing the cached
+    translations, which may be the ones that failed validation, and the new
+    translations replace them in the cache. The other rows are left as is.
+
+    Args:
+        df_translated (pl.DataFrame): Translated examples.
+        df_source (pl.DataFrame): The examples before translation.
+        ids (pl.Series): Ids of the rows to translate again, e.g. the retry
+            queue from `retry_queue`.
+
+    Returns:
+        pl.DataFrame: `df_translated` with the rows translated again.
+    """
+    translator = translator or AsyncDeepLTranslator()
+    df_retry = df_source.filter(pl.col("id").is_in(ids))
+    df_retry = translate_system_prompts(df_retry, translator=translator, cache=cache)
+    questions = df_retry["question"].to_list()
+    responses = df_retry["response"].to_list()
+    if stats is not None:
+        stats["texts"] = stats.get("texts", 0) + 2 * len(df_retry)
+        stats["source_characters"] = stats.get("source_characters", 0) + sum(
+            len(text) for text in questions + responses
+        )
+
+    async def run():
+        async with translator:
+            return await _translate_texts(
+                questions + responses, "DA", translator, cache, stats, refresh=True
+            )
+
+    translated_texts = asyncio.run(run())
+    df_retry = df_retry.select(
+        "id",
+        "system_prompt",
+        pl.Series("question", translated_texts[: len(df_retry)], dtype=pl.Utf8),
+        pl.Series("response", translated_texts[len(df_retry) :], dtype=pl.Utf8),
+    )
+    print(f"Translated {len(df_retry)} rows again.")
+    return df_translated.update(df_retry, on="id")
+
+
+def translate_system_prompts(
+    df: pl.DataFrame,
+    translator: AsyncDeepLTranslator | None = None,
+    cache: TranslationCache | None = None,
+) -> pl.DataFrame:
     """
     Translates unique system prompts in a DataFrame to Danish using DeepL.
 
@@ -70,6 +384,8 @@ def translate_system_prompts(df: pl.DataFrame) -> pl.DataFrame:
 
     Args:
     - dataframe (pl.DataFrame): A DataFrame containing a column 'system_prompt' with prompts to be translated.
+    - translator (AsyncDeepLTranslator): Client to send the DeepL requests with.
+    - cache (TranslationCache | None): Cache to look translations up in first.
 
     Returns:
     - pl.DataFrame: A DataFrame with the 'system_prompt' column updated with Danish translations.
@@ -78,14 +394,15 @@ def translate_system_prompts(df: pl.DataFrame) -> pl.DataFrame:
     # Extract unique system prompts from the DataFrame
     unique_system_prompts = df["system_prompt"].unique().to_list()
 
-    # Dictionary to hold translations
-    translated_system_prompts = {}
-
-    # Translate each unique system prompt to Danish
-    for system_prompt in unique_system_prompts:
-        translated_system_prompts.update(
-            {system_prompt: translate_with_deepl(system_prompt, "DA")}
+    # Translate the unique system prompts to Danish
+    translated_system_prompts = dict(
+        zip(
+            unique_system_prompts,
+            translate_batch_with_deepl(
+                unique_system_prompts, "DA", translator=translator, cache=cache
+            ),
         )
+    )
 
     # Update the DataFrame with translated prompts
     df = df.with_columns(pl.col("system_prompt").replace(translated_system_prompts))
@@ -93,22 +410,96 @@ def translate_system_prompts(df: pl.DataFrame) -> pl.DataFrame:
     return df
 
 
-def translate_examples(df: pl.DataFrame, save_freq: int) -> pl.DataFrame:
-    date = datetime.now().isoformat()[:19]
-
-    n_translations = 0
-    translated_rows = []
-    try:
-        for r in tqdm(df.to_dicts(), total=len(df)):
-            r["question"] = translate_with_deepl(r["question"], "DA")
-            r["response"] = translate_with_deepl(r["response"], "DA")
-            translated_rows.append(r)
-            n_translations += 1
-            if (n_translations % save_freq) == 0:
-                pl.DataFrame(translated_rows).write_parquet(
-                    config.data_dir / f"save_{date}.parquet"
-                )
-    except:
-        breakpoint()
+def translate_examples(
+    df: pl.DataFrame,
+    save_freq: int,
+    translator: AsyncDeepLTranslator | None = None,
+    cache: TranslationCache | None = None,
+    checkpoint: ShardedCheckpoint | None = None,
+    segmented: bool = config.translate_segments,
+    templates: pl.DataFrame | None = None,
+    stats: dict | None = None,
+) -> pl.DataFrame:
+    """
+    Translates questions and responses, checkpointing every `save_freq` rows.
 
-    return pl.DataFrame(translated_rows)
+    Each chunk of `save_freq` translated rows is written as a new shard of
+    `checkpoint`. Rows whose ids are already in a completed shard are skipped,
+    so a resumed checkpoint continues where the previous run stopped. With
+    `segmented`, texts are translated sentence by sentence through the
+    translation memory, see `_translate_segmented`. With `templates`, from
+    `mine_templates`, the shared question scaffolds are translated once and
+    only the slots of the questions are sent, see `_translate_templated`.
+    Character counts are added to `stats`, if given.
+    """
+    translator = translator or AsyncDeepLTranslator()
+    checkpoint = checkpoint or ShardedCheckpoint()
+    asyncio.run(
+        _translate_examples(
+            df, save_freq, translator, cache, checkpoint, segmented, templates, stats
+        )
+    )
+    return checkpoint.read(df["id"])
+
+
+async def _translate_examples(
+    df: pl.DataFrame,
+    save_freq: int,
+    translator: AsyncDeepLTranslator,
+    cache: TranslationCache | None,
+    checkpoint: ShardedCheckpoint,
+    segmented: bool,
+    templates: pl.DataFrame | None,
+    stats: dict | None,
+):
+    translate_texts = _translate_segmented if segmented else _translate_texts
+    df_remaining = checkpoint.remaining(df)
+    if len(df_remaining) < len(df):
+        print(f"Resuming: {len(df) - len(df_remaining)} rows already translated.")
+
+    async with translator:
+        if templates is not None:
+            scaffolds = await _translate_scaffolds(
+                templates, "DA", translator, cache, stats
+            )
+
+        with tqdm(total=len(df_remaining)) as progress_bar:
+            # Questions and responses of `save_freq` rows are batched into
+            # requests which are sent concurrently over the shared connection pool
+            for chunk in df_remaining.iter_slices(n_rows=save_freq):
+                n_rows = len(chunk)
+                questions = chunk["question"].to_list()
+                responses = chunk["response"].to_list()
+                if stats is not None:
+                    stats["texts"] = stats.get("texts", 0) + 2 * n_rows
+                    stats["source_characters"] = stats.get(
+                        "source_characters", 0
+                    ) + sum(len(text) for text in questions + responses)
+
+                if templates is None:
+                    translated_texts = await translate_texts(
+                        questions + responses, "DA", translator, cache, stats
+                    )
+                    translated_questions = translated_texts[:n_rows]
+                    translated_responses = translated_texts[n_rows:]
+                else:
+                    translated_questions, translated_responses = await asyncio.gather(
+                        _translate_templated(
+                            questions,
+                            "DA",
+                            translator,
+                            cache,
+                            stats,
+                            templates,
+                            scaffolds,
+                            segmented,
+                        ),
+                        translate_texts(responses, "DA", translator, cache, stats),
+                    )
+                checkpoint.write_shard(
+                    chunk.with_columns(
+                        pl.Series("question", translated_questions),
+                        pl.Series("response", translated_responses),
+                    )
+                )
+                progress_bar.update(n_rows)
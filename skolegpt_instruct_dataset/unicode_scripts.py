@@ -0,0 +1,207 @@
+import sys
+import unicodedata
+from functools import cache
+
+import numpy as np
+import polars as pl
+
+from .config import config
+
+# Code point ranges (inclusive) of the scripts, only the letters and marks in
+# them are counted. Combining diacritics are counted as Latin.
+SCRIPT_RANGES = [
+    ("Latin", 0x0041, 0x02AF),
+    ("Latin", 0x0300, 0x036F),
+    ("Latin", 0x1D00, 0x1DBF),
+    ("Latin", 0x1E00, 0x1EFF),
+    ("Latin", 0x2C60, 0x2C7F),
+    ("Latin", 0xA720, 0xA7FF),
+    ("Latin", 0xAB30, 0xAB6F),
+    ("Latin", 0xFB00, 0xFB06),
+    ("Latin", 0xFF21, 0xFF5A),
+    ("Greek", 0x0370, 0x03FF),
+    ("Greek", 0x1F00, 0x1FFF),
+    ("Cyrillic", 0x0400, 0x052F),
+    ("Cyrillic", 0x1C80, 0x1C8F),
+    ("Cyrillic", 0x2DE0, 0x2DFF),
+    ("Cyrillic", 0xA640, 0xA69F),
+    ("Armenian", 0x0530, 0x058F),
+    ("Hebrew", 0x0590, 0x05FF),
+    ("Hebrew", 0xFB1D, 0xFB4F),
+    ("Arabic", 0x0600, 0x06FF),
+    ("Arabic", 0x0750, 0x077F),
+    ("Arabic", 0x0870, 0x08FF),
+    ("Arabic", 0xFB50, 0xFDFF),
+    ("Arabic", 0xFE70, 0xFEFF),
+    ("Syriac", 0x0700, 0x074F),
+    ("Thaana", 0x0780, 0x07BF),
+    ("Devanagari", 0x0900, 0x097F),
+    ("Devanagari", 0xA8E0, 0xA8FF),
+    ("Bengali", 0x0980, 0x09FF),
+    ("Gurmukhi", 0x0A00, 0x0A7F),
+    ("Gujarati", 0x0A80, 0x0AFF),
+    ("Oriya", 0x0B00, 0x0B7F),
+    ("Tamil", 0x0B80, 0x0BFF),
+    ("Telugu", 0x0C00, 0x0C7F),
+    ("Kannada", 0x0C80, 0x0CFF),
+    ("Malayalam", 0x0D00, 0x0D7F),
+    ("Sinhala", 0x0D80, 0x0DFF),
+    ("Thai", 0x0E00, 0x0E7F),
+    ("Lao", 0x0E80, 0x0EFF),
+    ("Tibetan", 0x0F00, 0x0FFF),
+    ("Myanmar", 0x1000, 0x109F),
+    ("Georgian", 0x10A0, 0x10FF),
+    ("Georgian", 0x1C90, 0x1CBF),
+    ("Georgian", 0x2D00, 0x2D2F),
+    ("Hangul", 0x1100, 0x11FF),
+    ("Hangul", 0x3130, 0x318F),
+    ("Hangul", 0xA960, 0xA97F),
+    ("Hangul", 0xAC00, 0xD7FF),
+    ("Ethiopic", 0x1200, 0x139F),
+    ("Cherokee", 0x13A0, 0x13FF),
+    ("Khmer", 0x1780, 0x17FF),
+    ("Khmer", 0x19E0, 0x19FF),
+    ("Mongolian", 0x1800, 0x18AF),
+    ("Hiragana", 0x3040, 0x309F),
+    ("Katakana", 0x30A0, 0x30FF),
+    ("Katakana", 0x31F0, 0x31FF),
+    ("Katakana", 0xFF66, 0xFF9F),
+    ("Bopomofo", 0x3100, 0x312F),
+    ("Han", 0x2E80, 0x2FDF),
+    ("Han", 0x3005, 0x3007),
+    ("Han", 0x3021, 0x3029),
+    ("Han", 0x3400, 0x4DBF),
+    ("Han", 0x4E00, 0x9FFF),
+    ("Han", 0xF900, 0xFAFF),
+    ("Han", 0x20000, 0x3134F),
+]
+
+# Blocks of letters and marks used as symbols in any script, e.g. "ℝ", "ℓ",
+# the apostrophe "ʼ", the vector arrow in "v⃗" and the math bold "𝐱"
+COMMON_RANGES = [
+    (0x02B0, 0x02FF),  # Spacing Modifier Letters
+    (0x20D0, 0x20FF),  # Combining Diacritical Marks for Symbols
+    (0x2100, 0x214F),  # Letterlike Symbols
+    (0x1D400, 0x1D7FF),  # Mathematical Alphanumeric Symbols
+]
+
+SCRIPT_RATIO_COLUMNS = {
+    "question": "question_foreign_script_ratio",
+    "response": "response_foreign_script_ratio",
+}
+
+# "Common" are digits, punctuation, symbols and whitespace, "Other" are letters
+# outside the script ranges
+SCRIPTS = ["Common", "Other", *dict.fromkeys(name for name, _, _ in SCRIPT_RANGES)]
+
+
+@cache
+def script_table() -> np.ndarray:
+    """Index into `SCRIPTS` of every code point, computed once per process."""
+    is_letter = np.fromiter(
+        (
+            unicodedata.category(chr(code_point))[0] in "LM"
+            for code_point in range(sys.maxunicode + 1)
+        ),
+        dtype=bool,
+        count=sys.maxunicode + 1,
+    )
+    table = np.where(is_letter, SCRIPTS.index("Other"), 0).astype(np.uint8)
+    for name, start, end in SCRIPT_RANGES:
+        in_range = table[start : end + 1]
+        in_range[is_letter[start : end + 1]] = SCRIPTS.index(name)
+    for start, end in COMMON_RANGES:
+        table[start : end + 1] = SCRIPTS.index("Common")
+    return table
+
+
+def script_counts(
+    texts: pl.Series, chunk_size: int = config.script_count_chunk_size
+) -> np.ndarray:
+    """
+    Counts the letters of every script in every text.
+
+    Texts are processed in chunks of `chunk_size`, each decoded to a UTF-32
+    buffer whose code points are mapped to scripts with the lookup table and
+    counted per row with one `np.bincount`.
+
+    Returns:
+    np.ndarray: Counts of shape (len(texts), len(SCRIPTS)), nulls count as
+        empty texts.
+    """
+    table = script_table()
+    n_scripts = len(SCRIPTS)
+    counts = np.zeros((len(texts), n_scripts), dtype=np.int64)
+    for offset in range(0, len(texts), chunk_size):
+        chunk = texts.slice(offset, chunk_size).fill_null("")
+        code_points = np.frombuffer(
+            "".join(chunk.to_list()).encode("utf-32-le"), dtype=np.uint32
+        )
+        rows = np.repeat(np.arange(len(chunk)), chunk.str.len_chars().to_numpy())
+        counts[offset : offset + len(chunk)] = np.bincount(
+            rows * n_scripts + table[code_points], minlength=len(chunk) * n_scripts
+        ).reshape(len(chunk), n_scripts)
+    return counts
+
+
+def foreign_script_ratio(
+    texts: pl.Series, allowed_scripts: list[str] = config.allowed_scripts
+) -> pl.Series:
+    """
+    Fraction of the letters of every text outside `allowed_scripts`.
+
+    Letters of unlisted scripts ("Other") count as foreign, only the letters
+    and marks in `COMMON_RANGES` are neither allowed nor foreign.
+    """
+    unknown_scripts = set(allowed_scripts) - set(SCRIPTS)
+    if unknown_scripts:
+        raise ValueError(
+            f"Unknown scripts {sorted(unknown_scripts)}, expected some of {SCRIPTS}."
+        )
+    counts = script_counts(texts)
+    letters = counts[:, 1:].sum(axis=1)
+    allowed = counts[:, [SCRIPTS.index(name) for name in allowed_scripts]].sum(axis=1)
+    ratio = (letters - allowed) / np.maximum(letters, 1)
+    return pl.Series(texts.name, ratio, dtype=pl.Float32)
+
+
+def add_script_ratios(
+    df: pl.DataFrame | pl.LazyFrame,
+    allowed_scripts: list[str] = config.allowed_scripts,
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Adds the "question_foreign_script_ratio" and "response_foreign_script_ratio"
+    columns, see `foreign_script_ratio`.
+    """
+    return df.with_columns(
+        pl.col(column)
+        .map_batches(
+            lambda texts: foreign_script_ratio(texts, allowed_scripts),
+            return_dtype=pl.Float32,
+            is_elementwise=True,
+        )
+        .alias(ratio_column)
+        for column, ratio_column in SCRIPT_RATIO_COLUMNS.items()
+    )
+
+
+def script_profile(
+    df: pl.DataFrame, columns: tuple[str, ...] = ("question", "response")
+) -> pl.DataFrame:
+    """
+    Letters of every script in the given columns, and the texts containing them.
+
+    Returns:
+    pl.DataFrame: Columns "script", "letters" and "texts", most letters first.
+    """
+    letters = np.zeros(len(SCRIPTS), dtype=np.int64)
+    texts = np.zeros(len(SCRIPTS), dtype=np.int64)
+    for column in columns:
+        counts = script_counts(df[column])
+        letters += counts.sum(axis=0)
+        texts += (counts > 0).sum(axis=0)
+    return (
+        pl.DataFrame({"script": SCRIPTS, "letters": letters, "texts": texts})
+        .filter((pl.col("script") != "Common") & (pl.col("letters") > 0))
+        .sort("letters", descending=True)
+    )
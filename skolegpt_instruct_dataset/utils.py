@@ -3,10 +3,13 @@ import time
 from pathlib import Path
 
 import datasets
-import pandas as pd
 import polars as pl
 
+from .affixes import count_affixes
+from .budget import plan_translation_budget
 from .config import config
+from .id_index import TranslatedIdIndex
+from .master import MasterDataset
 
 
 def sample_and_print_example(df):
@@ -27,33 +30,24 @@ def sample_and_print_example(df):
     return s
 
 
-def analyse_pre_and_postfixes(df: pl.DataFrame):
+def analyse_pre_and_postfixes(df: pl.DataFrame) -> pl.DataFrame:
     """Analyse frequency of common pre- and postfixes."""
 
     # Analysing common question/instruction pre- and postfixes
-    print("--- Prefixes ---")
-    for prefix in config.common_prefixes:
-        freq = (
-            df["question"]
-            .str.strip_chars()
-            .str.to_lowercase()
-            .str.contains("^{prefix}".format(prefix=prefix.lower()))
-            .sum()
-        )
-        norm_freq = round(freq / len(df) * 100, 5)
-        print(f"Normalized Freq. {norm_freq}% | Freq.: {freq} | Term: '{prefix}' ")
-
-    print("\n--- Postfixes ---")
-    for postfix in config.common_postfixes:
-        freq = (
-            df["question"]
-            .str.strip_chars()
-            .str.to_lowercase()
-            .str.contains("{prefix}$".format(prefix=postfix.lower()))
-            .sum()
-        )
-        norm_freq = round(freq / len(df) * 100, 5)
-        print(f"Normalized Freq. {norm_freq}% | Freq.: {freq} | Term: '{postfix}' ")
+    counts = count_affixes(
+        df["question"], config.common_prefixes, config.common_postfixes
+    )
+    for kind in ["prefix", "postfix"]:
+        print(f"--- {kind.capitalize()}es ---")
+        for term, freq, norm_freq in (
+            counts.filter(pl.col("kind") == kind)
+            .select("term", "freq", "norm_freq")
+            .iter_rows()
+        ):
+            print(f"Normalized Freq. {norm_freq}% | Freq.: {freq} | Term: '{term}' ")
+        print()
+
+    return counts
 
 
 def print_elapsed_time(step, start_time):
@@ -61,70 +55,6 @@ def print_elapsed_time(step, start_time):
     print(f"{step} completed in {elapsed:.2f} seconds")
 
 
-def return_filter_char_list(df: pl.DataFrame) -> list[str]:
-    filter_chars = """
-        ビクター・シュムは、シンガポールのエネルギーアナリストであり、プルドーベイ油田の閉鎖は「トレーダーにとって驚きの種をまいた」と述べた。
-        นักวิเคราะห์พลังงานในสิงคโปรค์กล่าวว่าการปิดตัวของแหล่งน้ำมันอ่าว
-        ได้สร้างความประหลาดใจต่อผู้ค้า
-        アーノルド夫人の要求に関する調査で過失が申し立てられたムーア氏の民事訴訟において
-        もは告発された
-        過失が申し立てられた
-        知府
-        អ្នកជាប់ចោទត្រូវបានគេចោទប្រកាន់ពីការរំលោភសិទ្ធិកម្មសិទ្ធិបញ្ញាលើតួអង្គវិរៈបុរសម៉
-        ាវ៉ុលនិងកម្មសិទ្ធបញ្ញាដែលបង្កើតដោយស្ទេនលី។
-        彼は秘密を守るために、国家安全保障局とリンクした秘密の任務を受け、スパイ活動を行った。
-        អ្នកជាប់ចោទត្រូវបានគេចោទប្រកាន់ពីការរំលោភសិទ្ធិកម្មសិទ្ធិបញ
-        ្ញាលើតួអង្គវិរៈបុរសម៉ាវ៉ុលនិងកម្មសិទ្ធបញ្ញាដែលបង្កើតដោយស្ទេនលី។
-        では番目のファイルは
-        ઘાસના ઢોળેલા ખેતરમાં ઘેટાચરાવવાનું ટોળું
-        Парче дърво може да отвори вратата
-        তো শেহতীয়াকৈ কুছ মীঠা হো যায়ে অলপ মীঠা খাই লোৱা যাওঁক
-        শীৰ্ষকেৰে প্ৰচাৰ কৰা বিজ্ঞাপন সমূহে বহুল জনপ্ৰিয়তা পাইছে। পৰিয়ালৰ
-        সকলোটিলৈ লক্ষ্য ৰাখি সৃষ্টি কৰা এই বিজ্ঞাপন সমূহে দৰ্শকক আকৰ্ষিত কৰিছে
-        আৰু এতিয়া ভাৰতীয় উৎসৱ পাৰ্বণ সমূহতো ডেইৰী মিল্কে আকৰ্ষণীয় স্থান
-        পাবলৈ লৈছে
-        Ìíúòṣì
-        영국의동굴목록이며영국에서가장크고깊은동굴에대한정보를포함하고있습니다
-        های ایرانی عادت کنیم.   سرعت فیلم پایین بود و چندین
-        بار وسط فیلم ساعتم رو نگاه کردم.  بازی های بهتری از بازیگرهای فیلم
-        دیده بودیم و بازی ها هم در سطح متوسطی بود.  در کل ۲.۵ از
-        نظر شما در مورد داستان، فیلمنامه، دیالوگ ها و موضوع
-        فیلم  هت‌تریک چیست؟
-    """
-    filter_chars = filter_chars.replace("\n", "").replace(" ", "")
-    filter_chars = sorted(list(set(filter_chars)))
-    most_common_chars = get_n_most_common_chars(df=df.sample(config.n_total), n=10000)
-    filter_chars = [x for x in filter_chars if x not in most_common_chars]
-    return filter_chars
-
-
-def get_n_most_common_chars(df: pl.DataFrame, n: int = 10000) -> list[str]:
-    def flatten(xss):
-        return [x for xs in xss for x in xs]
-
-    print("Starting to flatten and combine characters from columns.")
-    all_chrs = flatten(
-        df["question"].str.to_lowercase().to_list()
-        + df["response"].str.to_lowercase().to_list()
-        + df["system_prompt"].str.to_lowercase().to_list()
-    )
-    print("Completed flattening and combining characters.")
-
-    print("Starting to count character occurrences.")
-    char_count = pl.Series(all_chrs).value_counts()
-    print("Completed counting character occurrences.")
-
-    print("Converting to pandas DataFrame and sorting.")
-    char_frq = char_count.to_pandas().sort_values(by="count")
-    print("Completed conversion and sorting.")
-
-    print(f"Selecting characters with occurrences more than {n}.")
-    most_common_chars = char_frq[char_frq["count"] > n][""].tolist()
-    print("Completed selecting most common characters.")
-
-    return most_common_chars
-
-
 # ---------------------------------------------------------------------------- #
 #                                  Path Stuff                                  #
 # ---------------------------------------------------------------------------- #
@@ -159,6 +89,26 @@ def load_parquet_file_with_polars(file_path):
     return pl.read_parquet(file_path)
 
 
+def scan_parquet_file_with_polars(file_path):
+    """
+    Lazily scans a Parquet file using Polars.
+
+    Args:
+    file_path (str): Path to the Parquet file to be scanned.
+
+    Returns:
+    polars.LazyFrame: Lazy query over the contents of the Parquet file.
+
+    Raises:
+    FileNotFoundError: If the Parquet file does not exist.
+    """
+    path = Path(file_path)
+    if not path.is_file():
+        raise FileNotFoundError(f"Parquet file not found: {file_path}")
+
+    return pl.scan_parquet(file_path)
+
+
 def count_total_characters(df):
     """
     Counts the total number of characters in the columns 'question', 'response' of a Polars DataFrame.
@@ -194,35 +144,41 @@ def estimate_translated_dataset_size_given_budget(
     """
     Estimates the number of dataset entries that can be translated by DeepL within a given budget.
 
-    This function calculates the total number of characters across specific columns ('question',
-    'response', and 'system_prompt') in a Polars DataFrame, and then estimates how many dataset
-    entries can be translated based on a specified budget and a fixed translation cost.
+    This function selects the entries with `plan_translation_budget`, which counts the exact
+    billable characters of every entry ('question' and 'response') and the unique system prompts,
+    which are only translated once, and returns the number of selected entries.
 
     Parameters:
     df (polars.DataFrame): The dataframe containing the dataset to be translated.
-                           It must have the columns 'question', 'response', and 'system_prompt'.
+                           It must have the columns 'question', 'response', 'system_prompt' and 'source'.
     max_budget_in_eur (int): The maximum budget available for translation, in euros.
 
     Returns:
     int: The estimated number of dataset entries that can be translated within the given budget.
-
-    Note:
-    - The function assumes uniform distribution of characters across dataset entries.
     """
-    price_pr_million_chars = 20
-    total_char_count = count_total_characters(df)
-    chars_pr_example = total_char_count / len(df)
+    return len(plan_translation_budget(df, max_budget_in_eur=max_budget_in_eur))
 
-    budgeted_chars = (max_budget_in_eur // price_pr_million_chars) * 1000000
 
-    return budgeted_chars // chars_pr_example
-
-
-def merge_new_examples_to_master_dataset(df_translated: pl.DataFrame):
-    ds = datasets.load_dataset("kobprof/skolegpt-instruct")
-    df_master = ds["train"].to_pandas()
-    df_translated = df_translated.to_pandas()
-    df_master = pd.concat([df_master, df_translated])
-    ds = datasets.Dataset.from_pandas(df_master, preserve_index=False)
-    ds = ds.shuffle()
-    return ds
+def merge_new_examples_to_master_dataset(
+    df_translated: pl.DataFrame, seed: int = config.seed
+) -> datasets.Dataset:
+    """
+    Appends new examples to the local master dataset and returns it shuffled.
+
+    The master dataset is downloaded from the hub once and kept as Parquet
+    shards in `data/master_dataset`, refreshed when the hub dataset has
+    changed since. Examples whose id is already in it are skipped, and the rest
+    is added as a new shard. The returned dataset is shuffled with `seed`
+    through an index permutation. Push it with `MasterDataset.push_to_hub`,
+    which refuses to overwrite rows added to the hub in the meantime.
+    """
+    TranslatedIdIndex().add(df_translated["id"])
+    master = MasterDataset()
+    if not master.exists():
+        master.download()
+    elif master.is_behind_hub():
+        print(f"The hub dataset {master.repo_id} changed, refreshing the local copy.")
+        master.refresh()
+    n_added = master.append(df_translated)
+    print(f"Added {n_added} new examples to the master dataset of {len(master)}.")
+    return master.to_dataset(seed=seed)
@@ -0,0 +1,149 @@
+import polars as pl
+
+from .config import config
+
+# Checks in the order of their bit in the "translation_issues" mask
+TRANSLATION_CHECKS = ["error_string", "empty_output", "length_ratio", "untranslated"]
+TRANSLATED_COLUMNS = ["question", "response"]
+
+# Error messages raised by `AsyncDeepLTranslator`, and stored in place of a
+# translation by earlier, synchronous versions of the translation
+ERROR_PATTERN = r"^Error: (?:\d{3}|None) - "
+
+# Function words that are frequent in English and do not occur in Danish
+ENGLISH_WORDS = [
+    "the",
+    "and",
+    "of",
+    "with",
+    "that",
+    "this",
+    "which",
+    "what",
+    "you",
+    "your",
+    "is",
+    "are",
+    "was",
+    "were",
+    "it",
+    "from",
+    "they",
+    "their",
+    "would",
+    "should",
+    "could",
+    "been",
+    "there",
+    "these",
+    "those",
+    "will",
+]
+
+
+def english_word_ratio(text: pl.Expr) -> pl.Expr:
+    """Fraction of the words of a text that are English function words."""
+    lowercase = text.str.to_lowercase()
+    n_words = lowercase.str.count_matches(r"\b\w+\b")
+    n_english = lowercase.str.count_matches(r"\b(?:" + "|".join(ENGLISH_WORDS) + r")\b")
+    return n_english / pl.max_horizontal(n_words, pl.lit(1))
+
+
+def translation_checks(
+    column: str,
+    length_ratio_bounds: list[float] = config.translation_length_ratio_bounds,
+    min_chars: int = config.translation_check_min_chars,
+    max_english_word_ratio: float = config.max_english_word_ratio,
+) -> dict[str, pl.Expr]:
+    """
+    Boolean expressions that are true for the rows whose translation of `column`
+    fails each check, given the source text in the "<column>_source" column.
+
+    The length ratio and untranslated checks only apply to sources of at least
+    `min_chars` characters, short texts vary too much.
+    """
+    translated, source = pl.col(column), pl.col(f"{column}_source")
+    ratio = translated.str.len_chars() / source.str.len_chars()
+    long_enough = source.str.len_chars() >= min_chars
+    low, high = length_ratio_bounds
+    checks = {
+        "error_string": translated.str.contains(ERROR_PATTERN),
+        "empty_output": (translated.str.strip_chars() == "")
+        & (source.str.strip_chars() != ""),
+        "length_ratio": long_enough & ((ratio < low) | (ratio > high)),
+        "untranslated": long_enough
+        & (
+            (translated == source)
+            | (english_word_ratio(translated) > max_english_word_ratio)
+        ),
+    }
+    return {name: checks[name] for name in TRANSLATION_CHECKS}
+
+
+def validate_translations(
+    df_translated: pl.DataFrame, df_source: pl.DataFrame
+) -> pl.DataFrame:
+    """
+    Checks every translated question and response against its source text.
+
+    All checks run in one `with_columns` pass over the rows joined by id. A
+    missing translation, e.g. a null, fails the error and empty checks, so such
+    rows are retried too.
+
+    Args:
+        df_translated (pl.DataFrame): Translated examples.
+        df_source (pl.DataFrame): The examples before translation.
+
+    Returns:
+        pl.DataFrame: Columns "id", one boolean column per check in
+            `TRANSLATION_CHECKS`, true if the question or response fails it,
+            and "translation_issues", a bitmask of the failed checks.
+    """
+    df = df_translated.select("id", *TRANSLATED_COLUMNS).join(
+        df_source.select(
+            "id", *[pl.col(c).alias(f"{c}_source") for c in TRANSLATED_COLUMNS]
+        ),
+        on="id",
+        how="inner",
+    )
+    checks = {
+        name: pl.any_horizontal(
+            translation_checks(column)[name].fill_null(True)
+            for column in TRANSLATED_COLUMNS
+        ).alias(name)
+        for name in TRANSLATION_CHECKS
+    }
+    mask = pl.sum_horizontal(
+        pl.when(pl.col(name))
+        .then(pl.lit(1 << bit, dtype=pl.UInt8))
+        .otherwise(pl.lit(0, dtype=pl.UInt8))
+        for bit, name in enumerate(TRANSLATION_CHECKS)
+    )
+    return df.select("id", *checks.values()).with_columns(
+        mask.cast(pl.UInt8).alias("translation_issues")
+    )
+
+
+def retry_queue(df_validation: pl.DataFrame) -> pl.DataFrame:
+    """The ids of the rows failing any check, with the names of the checks."""
+    return df_validation.filter(pl.col("translation_issues") != 0).select(
+        "id",
+        pl.concat_list(
+            pl.when(pl.col(name)).then(pl.lit(name)).otherwise(None)
+            for name in TRANSLATION_CHECKS
+        )
+        .list.drop_nulls()
+        .alias("failed_checks"),
+    )
+
+
+def print_validation_summary(df_validation: pl.DataFrame):
+    counts = df_validation.select(
+        pl.len().alias("rows"),
+        (pl.col("translation_issues") != 0).sum().alias("flagged"),
+        *[pl.col(name).sum() for name in TRANSLATION_CHECKS],
+    ).row(0, named=True)
+    print(
+        f"{counts['flagged']} of {counts['rows']} translated rows flagged: "
+        + ", ".join(f"{name} {counts[name]}" for name in TRANSLATION_CHECKS)
+    )
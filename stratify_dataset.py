@@ -11,6 +11,7 @@ def main(
     n_total: int = config.n_total,
     instruction_sources: list[str] = config.instruction_sources,
     seed: int = config.seed,
+    strata: list[str] = config.stratification_keys,
 ):
     df = load_parquet_file_with_polars(
         config.data_dir / config.filtered_dataset_file_name
@@ -21,6 +22,7 @@ def main(
         n_total=n_total,
         instruction_sources=instruction_sources,
         seed=seed,
+        strata=strata,
     )
 
     print("Completed stratifying dataframe.")
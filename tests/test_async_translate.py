@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+import pytest
+
+from skolegpt_instruct_dataset.async_translate import (
+    AsyncDeepLTranslator,
+    DeepLError,
+    TokenBucket,
+)
+from skolegpt_instruct_dataset.cache import TranslationCache, translation_key
+from skolegpt_instruct_dataset.mock_deepl import (
+    MockRequestHandler,
+    run_mock_deepl_server,
+)
+from skolegpt_instruct_dataset.translate import _translate_texts
+
+
+def make_translator(url: str, **kwargs) -> AsyncDeepLTranslator:
+    kwargs = {
+        "auth_key": "test",
+        "requests_per_second": None,
+        "chars_per_second": None,
+        "backoff_base": 0.001,
+        "backoff_max": 0.01,
+        **kwargs,
+    }
+    return AsyncDeepLTranslator(url=url, **kwargs)
+
+
+def translate(translator: AsyncDeepLTranslator, batches: list[list[str]]):
+    async def run():
+        async with translator:
+            return await translator.translate_batches(batches, "DA")
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("fail_statuses", [[429], [500, 503], [429, 502, 529]])
+def test_retries_then_succeeds(fail_statuses):
+    with run_mock_deepl_server(fail_statuses=fail_statuses) as server:
+        translator = make_translator(server.url, max_retries=3)
+        assert translate(translator, [["Hello", "World"]]) == [
+            ["[DA] Hello", "[DA] World"]
+        ]
+    assert translator.stats["retries"] == len(fail_statuses)
+    assert server.stats["requests"] == len(fail_statuses) + 1
+    assert server.stats["rejected"] == len(fail_statuses)
+
+
+def test_exhausted_retries_raise():
+    with run_mock_deepl_server(fail_statuses=[503] * 3) as server:
+        translator = make_translator(server.url, max_retries=2)
+        with pytest.raises(DeepLError) as error:
+            translate(translator, [["Hello"]])
+    assert error.value.status_code == 503
+    assert server.stats["requests"] == 3
+
+
+def test_client_errors_are_not_retried():
+    with run_mock_deepl_server(fail_statuses=[456]) as server:
+        translator = make_translator(server.url, max_retries=3)
+        with pytest.raises(DeepLError) as error:
+            translate(translator, [["Hello"]])
+    assert error.value.status_code == 456
+    assert server.stats["requests"] == 1
+
+
+def test_retry_after_of_rate_limited_server():
+    with run_mock_deepl_server(max_requests_per_second=20) as server:
+        translator = make_translator(server.url, concurrency=4, max_retries=10)
+        batches = [[f"text {i}"] for i in range(40)]
+        assert translate(translator, batches) == [[f"[DA] text {i}"] for i in range(40)]
+    assert server.stats["rejected"] > 0
+    assert translator.stats["retries"] == server.stats["rejected"]
+
+
+def test_token_bucket_limits_rate():
+    async def run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.09
+
+
+def test_failed_batch_keeps_translated_batches(tmp_path):
+    cache = TranslationCache(tmp_path / "cache.sqlite")
+    texts = [f"text {i}" for i in range(60)]
+
+    async def run(translator):
+        async with translator:
+            return await _translate_texts(texts, "DA", translator, cache)
+
+    # One request at a time, so the first batch of 50 texts gets the failure
+    with run_mock_deepl_server(fail_statuses=[400]) as server:
+        translator = make_translator(server.url, concurrency=1, max_retries=0)
+        with pytest.raises(DeepLError):
+            asyncio.run(run(translator))
+    cached = cache.get_many([translation_key(text, "DA") for text in texts])
+    assert len(cached) == 10
+
+    with run_mock_deepl_server() as server:
+        translator = make_translator(server.url)
+        assert asyncio.run(run(translator)) == [f"[DA] {text}" for text in texts]
+    assert server.stats["texts"] == 50
+
+
+def test_mock_request_handler_is_abstract():
+    with pytest.raises(TypeError):
+        MockRequestHandler(None, None, None)
@@ -0,0 +1,64 @@
+import polars as pl
+
+from skolegpt_instruct_dataset.budget import budget_report, plan_translation_budget
+
+
+def make_df(sizes: dict[str, int], system_prompts: list[str]) -> pl.DataFrame:
+    rows = [
+        {
+            "id": f"{source}.{i}",
+            "system_prompt": system_prompts[i % len(system_prompts)],
+            "question": "q" * (10 + i % 7),
+            "response": "r" * (20 + i % 5),
+            "source": source,
+        }
+        for source, size in sizes.items()
+        for i in range(size)
+    ]
+    return pl.DataFrame(rows)
+
+
+def test_selection_stays_within_max_chars():
+    system_prompts = ["You are a helpful assistant.", "Think step by step.", ""]
+    df = make_df({"cot": 50, "flan": 200}, system_prompts)
+    for max_chars in [0, 45, 500, 2_000, 5_000]:
+        selected = plan_translation_budget(df, max_chars=max_chars)
+        report = budget_report(selected)
+        assert report["billable_characters"] <= max_chars
+        # The next row in line would not have fit
+        if len(selected) < len(df):
+            assert len(plan_translation_budget(df, max_chars=max_chars + 100)) > len(
+                selected
+            )
+
+
+def test_shared_system_prompts_are_counted_once():
+    system_prompt = "You are a helpful assistant." * 10
+    df = make_df({"cot": 20, "flan": 20}, [system_prompt])
+    row_chars = df.select(
+        pl.col("question").str.len_chars() + pl.col("response").str.len_chars()
+    ).to_series()
+
+    selected = plan_translation_budget(df, max_chars=None)
+    assert len(selected) == len(df)
+    assert budget_report(selected)["billable_characters"] == row_chars.sum() + len(
+        system_prompt
+    )
+
+    # A budget fitting all rows but the system prompt only once selects all rows
+    selected = plan_translation_budget(
+        df, max_chars=row_chars.sum() + len(system_prompt)
+    )
+    assert len(selected) == len(df)
+
+
+def test_strata_fill_at_the_same_pace():
+    df = make_df({"cot": 10, "flan": 1_000}, [""])
+    selected = plan_translation_budget(df, max_chars=16 * 35)
+    counts = dict(selected.group_by("source").len().iter_rows())
+    assert abs(counts["cot"] - counts["flan"]) <= 1
+
+    # A small stratum runs out and the budget goes to the others
+    selected = plan_translation_budget(df, max_chars=100 * 35)
+    counts = dict(selected.group_by("source").len().iter_rows())
+    assert counts["cot"] == 10 and counts["flan"] > 10
@@ -0,0 +1,38 @@
+import logging
+
+import polars as pl
+
+from skolegpt_instruct_dataset.dedup import (
+    minhash_signatures,
+    near_duplicate_clusters,
+    remove_near_duplicates,
+)
+
+QUESTIONS = [
+    "Write a short summary of the following article about the history of the "
+    "printing press in Europe and its influence on the spread of literacy.",
+    "What is the capital of France, and which river runs through the city?",
+    "Write a short summary of the following article about the history of the "
+    "printing press in Europe and its influence on the spread of literacy!",
+    "Solve for x in the equation 3x + 7 = 22 and explain every step you take.",
+    "Translate the sentence into German: the weather is lovely this morning.",
+    "Write a short summary of the following article about the history of the "
+    "printing press in Europe and its influence on the spread of literacy.",
+]
+
+
+def test_near_duplicates_collapse_to_the_lower_index():
+    signatures = minhash_signatures(pl.Series("question", QUESTIONS))
+    labels = near_duplicate_clusters(signatures)
+    assert labels.tolist() == [0, 1, 0, 3, 4, 0]
+
+
+def test_remove_near_duplicates_keeps_distinct_questions(caplog):
+    df = pl.DataFrame(
+        {"id": [f"row.{i}" for i in range(len(QUESTIONS))], "question": QUESTIONS}
+    )
+    with caplog.at_level(logging.INFO, logger="skolegpt_instruct_dataset.dedup"):
+        kept = remove_near_duplicates(df)
+    assert kept["id"].to_list() == ["row.0", "row.1", "row.3", "row.4"]
+    assert "1 near-duplicate clusters" in caplog.text
+    assert "removing 2 rows" in caplog.text
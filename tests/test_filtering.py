@@ -0,0 +1,130 @@
+import random
+import unicodedata
+
+import polars as pl
+import pytest
+
+from skolegpt_instruct_dataset.filtering import (
+    FILTER_RULES,
+    PYTHON_WHITESPACE,
+    ends_with_colon,
+)
+from skolegpt_instruct_dataset.unicode_scripts import (
+    COMMON_RANGES,
+    SCRIPT_RANGES,
+    foreign_script_ratio,
+)
+
+
+@pytest.fixture(scope="module")
+def df() -> pl.DataFrame:
+    """Random texts mixing words, colons, Unicode whitespace and control characters."""
+    rng = random.Random(42)
+    pieces = [
+        "What is",
+        "Answer",
+        ":",
+        "::",
+        "Options:",
+        " ",
+        "\n",
+        "\t",
+        "\x1c",
+        "\x85",
+        "\xa0",
+        "\u2003",
+        "\u200b",
+        "\u3000",
+        "ℝ",
+        "ʼ",
+        "v⃗",
+        "𝐱",
+        "Привет",
+        "日本",
+        "ñandú",
+        "Ωμέγα",
+        "ሰላም",
+        "42",
+    ]
+    texts = ["".join(rng.choices(pieces, k=rng.randint(0, 8))) for _ in range(5000)]
+    return pl.DataFrame(
+        {
+            "id": [f"row.{i}" for i in range(len(texts))],
+            "question": texts,
+            "response": texts[::-1],
+        }
+    )
+
+
+def legacy_remove_questions_ending_with_colon(df):
+    # The map_elements implementation replaced by native expressions
+    return df.filter(~df["question"].map_elements(lambda x: x.strip().endswith(":")))
+
+
+def test_python_whitespace_matches_str_strip():
+    stripped = {chr(c) for c in range(0x110000) if chr(c).strip() == ""}
+    assert stripped == set(PYTHON_WHITESPACE)
+
+
+def test_ends_with_colon_matches_map_elements(df):
+    assert "ends_with_colon" in FILTER_RULES
+    expected = legacy_remove_questions_ending_with_colon(df)
+    result = df.filter(~ends_with_colon())
+    assert 0 < len(result) < len(df)
+    assert result.equals(expected)
+
+
+def test_ends_with_colon_lazy(df):
+    result = df.lazy().filter(~ends_with_colon()).collect(streaming=True)
+    assert result.equals(legacy_remove_questions_ending_with_colon(df))
+
+
+def reference_script(char: str) -> str:
+    code_point = ord(char)
+    if unicodedata.category(char)[0] not in "LM" or any(
+        start <= code_point <= end for start, end in COMMON_RANGES
+    ):
+        return "Common"
+    for name, start, end in SCRIPT_RANGES:
+        if start <= code_point <= end:
+            return name
+    return "Other"
+
+
+def reference_foreign_script_ratio(text: str, allowed_scripts: list[str]) -> float:
+    scripts = [reference_script(char) for char in text]
+    letters = [script for script in scripts if script != "Common"]
+    foreign = [script for script in letters if script not in allowed_scripts]
+    return len(foreign) / max(len(letters), 1)
+
+
+@pytest.mark.parametrize("allowed_scripts", [["Latin", "Greek"], ["Latin"]])
+def test_foreign_script_ratio_matches_map_elements(df, allowed_scripts):
+    expected = df.select(
+        pl.col("question").map_elements(
+            lambda text: reference_foreign_script_ratio(text, allowed_scripts),
+            return_dtype=pl.Float64,
+        )
+    )["question"]
+    result = foreign_script_ratio(df["question"], allowed_scripts)
+    assert (result > 0).any() and (result == 0).any()
+    assert ((result.cast(pl.Float64) - expected).abs() < 1e-6).all()
+
+
+def test_unlisted_scripts_are_foreign():
+    # Tifinagh, Canadian Syllabics, N'Ko and Javanese are not in SCRIPT_RANGES
+    texts = pl.Series(
+        "question",
+        [
+            "\u2d5c\u2d30\u2d4e\u2d30\u2d63\u2d49\u2d56\u2d5c",
+            "\u14c4\u14c7\u1557\u1466",
+            "\u07d2\u07de\u07cf",
+            "\ua98f\ua9ae\ua9c0",
+            "abc \u2d5c",
+            "\u2102 \U0001d431",
+        ],
+    )
+    ratios = foreign_script_ratio(texts, ["Latin", "Greek"]).to_list()
+    assert ratios[:4] == [1.0] * 4
+    assert ratios[4] == pytest.approx(0.25)
+    assert ratios[5] == 0.0
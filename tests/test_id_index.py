@@ -0,0 +1,38 @@
+import polars as pl
+import pytest
+
+from skolegpt_instruct_dataset.filtering import is_already_translated
+from skolegpt_instruct_dataset.id_index import TranslatedIdIndex
+
+
+def test_missing_index_is_empty(tmp_path):
+    index = TranslatedIdIndex(tmp_path / "ids")
+    ids = pl.Series("id", ["flan.1", "cot.2"])
+
+    assert not index.exists()
+    assert len(index) == 0
+    assert index.contains(ids).to_list() == [False, False]
+
+    with pytest.warns(UserWarning, match="No translated id index"):
+        rule = is_already_translated(index)
+    assert pl.DataFrame({"id": ids}).select(rule)["id"].to_list() == [False, False]
+
+
+def test_add_writes_deltas_and_compacts(tmp_path):
+    index = TranslatedIdIndex(tmp_path / "ids", max_deltas=3)
+
+    index.add(pl.Series("id", ["flan.1", "flan.2"]))
+    index.add(pl.Series("id", ["flan.2", "cot.3", None]))
+    assert len(index.delta_paths()) == 2
+    assert len(index) == 3
+
+    index.add(pl.Series("id", ["niv.4"]))
+    assert index.delta_paths() == []
+    assert len(index) == 4
+
+    index.add(pl.Series("id", ["t0.5"]))
+    ids = pl.Series("id", ["flan.1", "cot.3", "niv.4", "t0.5", "t0.6"])
+    assert index.contains(ids).to_list() == [True, True, True, True, False]
+
+    index.remove()
+    assert not index.exists()
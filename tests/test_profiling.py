@@ -0,0 +1,20 @@
+import polars as pl
+
+from skolegpt_instruct_dataset.profiling import StepProfiler
+
+
+def test_table_without_steps():
+    lines = StepProfiler().table().splitlines()
+    assert lines[0].split(" | ")[0] == "step"
+    assert len(lines) == 2
+
+
+def test_table_with_steps():
+    profiler = StepProfiler()
+    df = profiler.run(
+        "drop_half", lambda df: df.head(5), pl.DataFrame({"a": range(10)})
+    )
+    assert len(df) == 5
+    lines = profiler.table().splitlines()
+    assert len(lines) == 3
+    assert lines[2].startswith("drop_half")
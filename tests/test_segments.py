@@ -0,0 +1,71 @@
+import pytest
+
+from skolegpt_instruct_dataset.segments import (
+    join_segments,
+    needs_translation,
+    split_segments,
+)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (
+            "The sky is blue. Grass is green! Is it? Yes.",
+            ["The sky is blue.", "Grass is green!", "Is it?", "Yes."],
+        ),
+        ("First line\n\nSecond line", ["First line", "Second line"]),
+        (
+            "It costs 3.5 dollars. 42 is the answer.",
+            ["It costs 3.5 dollars.", "42 is the answer."],
+        ),
+        ('He said no. "Why?" she asked.', ["He said no.", '"Why?" she asked.']),
+    ],
+)
+def test_split_segments(text, expected):
+    assert split_segments(text)[0] == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (
+            "Dr. Smith visited the U.S. Army base.",
+            ["Dr. Smith visited the U.S. Army base."],
+        ),
+        (
+            "Mr. and Mrs. Jones arrived. They sat down.",
+            ["Mr. and Mrs. Jones arrived.", "They sat down."],
+        ),
+        (
+            "J. R. R. Tolkien wrote it. It sold well.",
+            ["J. R. R. Tolkien wrote it.", "It sold well."],
+        ),
+        (
+            "See Fig. 3 for details. It is clear.",
+            ["See Fig. 3 for details.", "It is clear."],
+        ),
+        ("The meeting is on Jan. 5 at noon.", ["The meeting is on Jan. 5 at noon."]),
+    ],
+)
+def test_split_segments_keeps_abbreviations_and_initials(text, expected):
+    assert split_segments(text)[0] == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "   ",
+        "  One. Two.\n\n  Three?  ",
+        "Dr. Who met Mr. X. Then they left.\r\nThe end.\n",
+    ],
+)
+def test_join_segments_restores_text(text):
+    assert join_segments(*split_segments(text)) == text
+
+
+def test_needs_translation():
+    assert needs_translation("Hello.")
+    assert not needs_translation("42.")
+    assert not needs_translation("- 3.5 -")
@@ -0,0 +1,79 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from skolegpt_instruct_dataset.filtering import stratify_dataframe, water_fill
+
+SOURCES = ["cot", "flan", "niv", "t0"]
+
+
+@pytest.fixture(scope="module")
+def df() -> pl.DataFrame:
+    """Strata of very different sizes, one of them smaller than its fair share."""
+    sizes = {"cot": 5, "flan": 400, "niv": 120, "t0": 60}
+    ids = [f"{source}.{i}" for source, size in sizes.items() for i in range(size)]
+    return pl.DataFrame(
+        {
+            "id": ids,
+            "question": [f"Question {id}" for id in ids],
+            "source": [id.split(".")[0] for id in ids],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "capacities, n_total, expected",
+    [
+        ([2, 10, 10], 12, [2, 5, 5]),
+        ([1, 1, 100], 10, [1, 1, 8]),
+        ([3, 3, 3], 7, [3, 2, 2]),
+        ([4, 0, 9], 20, [4, 0, 9]),
+        ([5, 5], 0, [0, 0]),
+    ],
+)
+def test_water_fill(capacities, n_total, expected):
+    assert water_fill(np.array(capacities), n_total).tolist() == expected
+
+
+def test_water_fill_redistributes_shortfall():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        capacities = rng.integers(0, 50, size=rng.integers(1, 10))
+        n_total = int(rng.integers(0, 300))
+        allocation = water_fill(capacities, n_total)
+        assert allocation.sum() == min(n_total, capacities.sum())
+        assert (allocation <= capacities).all()
+        # No group gets more than one above a group that is not exhausted
+        unsaturated = allocation[allocation < capacities]
+        if len(unsaturated):
+            assert (allocation <= unsaturated.min() + 1).all()
+
+
+def test_stratify_samples_exactly_n_total(df):
+    stratified = stratify_dataframe(df, 300, SOURCES, seed=42, strata=["source"])
+    assert len(stratified) == 300
+    counts = dict(stratified.group_by("source").len().iter_rows())
+    # cot and t0 give all their rows, their shortfall goes to flan and niv
+    assert counts == {"cot": 5, "flan": 118, "niv": 117, "t0": 60}
+
+
+def test_stratify_n_total_above_rows(df):
+    stratified = stratify_dataframe(df, 10_000, SOURCES, seed=42, strata=["source"])
+    assert stratified.sort("id").equals(df.sort("id"))
+
+
+def test_stratify_is_deterministic(df):
+    first = stratify_dataframe(df, 100, SOURCES, seed=7, strata=["source"])
+    again = stratify_dataframe(df, 100, SOURCES, seed=7, strata=["source"])
+    shuffled = stratify_dataframe(
+        df.sample(fraction=1.0, shuffle=True, seed=1),
+        100,
+        SOURCES,
+        seed=7,
+        strata=["source"],
+    )
+    other_seed = stratify_dataframe(df, 100, SOURCES, seed=8, strata=["source"])
+
+    assert first.equals(again)
+    assert set(first["id"]) == set(shuffled["id"])
+    assert set(first["id"]) != set(other_seed["id"])
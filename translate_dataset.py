@@ -1,24 +1,211 @@
+import json
+import time
+
+import polars as pl
 import typer
 
+from skolegpt_instruct_dataset.async_translate import AsyncDeepLTranslator
+from skolegpt_instruct_dataset.cache import TranslationCache
+from skolegpt_instruct_dataset.checkpoint import ShardedCheckpoint, checkpoint_directory
 from skolegpt_instruct_dataset.config import config
-from skolegpt_instruct_dataset.translate import translate_dataset
+from skolegpt_instruct_dataset.id_index import TranslatedIdIndex
+from skolegpt_instruct_dataset.templates import mine_templates
+from skolegpt_instruct_dataset.translate import (
+    retranslate_rows,
+    translate_dataset,
+    validate_templates,
+)
 from skolegpt_instruct_dataset.utils import load_parquet_file_with_polars
+from skolegpt_instruct_dataset.validation import (
+    print_validation_summary,
+    retry_queue,
+    validate_translations,
+)
+
+
+def main(
+    input_file_name: str = config.stratified_dataset_file_name,
+    save_freq: int = 1000,
+    deepl_url: str = config.deepl_url,
+    concurrency: int = config.deepl_concurrency,
+    requests_per_second: float = config.deepl_requests_per_second,
+    chars_per_second: float = config.deepl_chars_per_second,
+    max_retries: int = config.deepl_max_retries,
+    cache: bool = True,
+    resume: bool = False,
+    segments: bool = config.translate_segments,
+    templates: bool = config.translate_templates,
+    template_validation_size: int = 0,
+    retry: bool = False,
+    max_retry_attempts: int = config.translation_max_retry_attempts,
+):
+    input_path = config.data_dir / input_file_name
+    df = load_parquet_file_with_polars(input_path)
 
+    df = df.sample(len(df), shuffle=True, seed=config.seed)
 
-def main(save_freq: int = 100):
-    df = load_parquet_file_with_polars(
-        config.data_dir / config.stratified_dataset_file_name
+    translator = AsyncDeepLTranslator(
+        url=deepl_url,
+        concurrency=concurrency,
+        requests_per_second=requests_per_second,
+        chars_per_second=chars_per_second,
+        max_retries=max_retries,
     )
 
-    df = df.sample(len(df), shuffle=True)
+    translation_cache = TranslationCache() if cache else None
 
-    df_translated = translate_dataset(df, save_freq)
+    if retry:
+        retry_flagged_rows(df, translator, translation_cache, max_retry_attempts)
+        return
+
+    df_templates = None
+    if templates or template_validation_size:
+        df_templates = mine_templates(df["question"])
+        df_templates.write_parquet(
+            config.data_dir / config.question_templates_file_name
+        )
+        print(f"Found {len(df_templates)} question templates.")
+
+    if template_validation_size:
+        validate_templates(
+            df,
+            df_templates,
+            n=template_validation_size,
+            translator=translator,
+            cache=translation_cache,
+            segmented=segments,
+        ).write_parquet(config.data_dir / config.template_validation_file_name)
+        return
+
+    checkpoint = ShardedCheckpoint(
+        checkpoint_directory(
+            config.data_dir / config.translation_checkpoint_dir_name, input_path
+        ),
+        resume=resume,
+    )
+    stats = {}
+
+    df_translated = translate_dataset(
+        df,
+        save_freq,
+        translator=translator,
+        cache=translation_cache,
+        checkpoint=checkpoint,
+        segmented=segments,
+        templates=df_templates,
+        stats=stats,
+    )
 
     print("Completed translating dataset.")
+    print(f"DeepL requests: {translator.stats}")
+    if translation_cache is not None:
+        print(f"Translation cache: {translation_cache.stats}")
+    write_translation_stats(stats, segments, df_templates is not None)
 
     df_translated.write_parquet(config.data_dir / config.translated_dataset_file_name)
+    write_retry_queue(df_translated, df, max_attempts=max_retry_attempts)
+
+    TranslatedIdIndex().add(df_translated["id"])
+    checkpoint.remove()
+
+
+def retry_flagged_rows(
+    df: pl.DataFrame,
+    translator: AsyncDeepLTranslator,
+    translation_cache: TranslationCache | None,
+    max_attempts: int = config.translation_max_retry_attempts,
+):
+    """
+    Translates the rows in the retry queue again and merges them back by id.
+
+    Every retried row counts an attempt, rows still flagged after
+    `max_attempts` are moved from the queue to the rejected rows.
+    """
+    translated_path = config.data_dir / config.translated_dataset_file_name
+    queue = pl.read_parquet(config.data_dir / config.translation_retry_queue_file_name)
+    if queue.is_empty():
+        print("The retry queue is empty.")
+        return
+    rejected_path = config.data_dir / config.translation_rejected_file_name
+    rejected = pl.read_parquet(rejected_path) if rejected_path.is_file() else None
+
+    stats = {}
+    df_translated = retranslate_rows(
+        load_parquet_file_with_polars(translated_path),
+        df,
+        queue["id"],
+        translator=translator,
+        cache=translation_cache,
+        stats=stats,
+    )
+    write_translation_stats(stats, segments=False, templates=False)
+    df_translated.write_parquet(translated_path)
+
+    attempts = [queue.select("id", pl.col("attempts") + 1)]
+    if rejected is not None:
+        attempts.append(rejected.select("id", "attempts"))
+    write_retry_queue(df_translated, df, pl.concat(attempts), max_attempts)
+
+
+def write_retry_queue(
+    df_translated: pl.DataFrame,
+    df: pl.DataFrame,
+    attempts: pl.DataFrame | None = None,
+    max_attempts: int = config.translation_max_retry_attempts,
+):
+    """
+    Validates the translations and writes the ids of the flagged rows.
+
+    Args:
+        df_translated (pl.DataFrame): Translated examples.
+        df (pl.DataFrame): The examples before translation.
+        attempts (pl.DataFrame | None): Columns "id" and "attempts", the number
+            of times each row was translated again, None for a first run.
+        max_attempts (int): Flagged rows with this many attempts are written
+            to the rejected rows instead of the retry queue, so rows failing
+            deterministically, e.g. code left in English, are not billed again
+            on every retry.
+    """
+    df_validation = validate_translations(df_translated, df)
+    print_validation_summary(df_validation)
+    if attempts is None:
+        attempts = pl.DataFrame(schema={"id": pl.Utf8, "attempts": pl.UInt32})
+    queue = (
+        retry_queue(df_validation)
+        .join(attempts, on="id", how="left")
+        .with_columns(pl.col("attempts").fill_null(0).cast(pl.UInt32))
+    )
+    exhausted = pl.col("attempts") >= max_attempts
+    queue.filter(~exhausted).write_parquet(
+        config.data_dir / config.translation_retry_queue_file_name
+    )
+    rejected = queue.filter(exhausted)
+    rejected.write_parquet(config.data_dir / config.translation_rejected_file_name)
+    if len(rejected):
+        print(
+            f"{len(rejected)} rows are still flagged after {max_attempts} retries "
+            f"and are no longer retried, see {config.translation_rejected_file_name}."
+        )
+
 
-    breakpoint()
+def write_translation_stats(stats: dict, segments: bool, templates: bool):
+    """Prints the billed characters of the run and appends them to the stats file."""
+    source_characters = stats.get("source_characters", 0)
+    billed_characters = stats.get("billed_characters", 0)
+    record = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "segmented": segments,
+        "templated": templates,
+        "texts": stats.get("texts", 0),
+        "segments": stats.get("segments", 0),
+        "sent_texts": stats.get("sent_texts", 0),
+        "source_characters": source_characters,
+        "billed_characters": billed_characters,
+        "saved_characters": source_characters - billed_characters,
+    }
+    with open(config.data_dir / config.translation_stats_file_name, "a") as file:
+        file.write(json.dumps(record) + "\n")
+    print(f"Translation stats: {record}")
 
 
 if __name__ == "__main__":